@@ -1,11 +1,27 @@
-# Conversation tree with Po, the Dragon Warrior, represented as nested dictionaries
-import re
-from difflib import get_close_matches
+# Offline chat simulator: conversation trees of nested dictionaries, matched against what the user types
+import os
+import time
+from itertools import count
+from cache import MISSING, MatchCache
+from dialogue import DEFAULT_EMOJI, NARRATOR, NARRATOR_COLOR, load_json_tree, script_sources
+from fuzzy import DEFAULT_BACKEND, make_matcher
+from keywords import VOCABULARY, KeywordMatrix, Vocabulary
+from render import terminal_renderer
+from semantic import DEFAULT_THRESHOLD, SemanticMatcher
+import snapshot
+from substring import SubstringMatcher
 def color_text(text, color_code):
     return f"\033[{color_code}m{text}\033[0m"
 
+# ASCII characters that are neither word characters nor whitespace
+_ASCII_PUNCTUATION = {c: None for c in range(128) if not (chr(c).isalnum() or chr(c) == "_" or chr(c).isspace())}
+
 def normalize(text):
     """Lowercase, remove punctuation, and extra spaces for flexible matching."""
+    if text.isascii():
+        # Same result as the regexes below, without importing re at startup
+        return " ".join(text.translate(_ASCII_PUNCTUATION).lower().split())
+    import re
     text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
     return re.sub(r'\s+', ' ', text.strip().lower())
 
@@ -14,459 +30,539 @@ def extract_keywords(text):
     words = [w for w in normalize(text).split() if len(w) > 2]
     return set(words)
 
-from difflib import get_close_matches
 
-def match_option(user_input, options):
+class OptionIndex:
+    """Match data for one node's options, computed once instead of on every turn."""
+
+    __slots__ = ("uid", "options", "keys", "entries", "norm_to_key", "norm_texts", "keywords", "fuzzy", "substring",
+                 "semantic")
+
+    # Up to this many options the plain scan is faster per query than the automata,
+    # even for long inputs (measured crossover: 400-500 options), and costs nothing to build
+    SUBSTRING_SCAN_MAX = 400
+    _uids = count()
+
+    def __init__(self, options, fuzzy_backend=None, keyword_weighting="count", vocabulary=VOCABULARY):
+        # Never reused, unlike id(), so it can key the match cache
+        self.uid = next(OptionIndex._uids)
+        self.options = options
+        self.keys = list(options)
+        # (key, normalized text) in option order, for the substring pass
+        self.entries = [(key, normalize(opt['text'])) for key, opt in options.items()]
+        # Later duplicates win, exactly like the old dict comprehension
+        self.norm_to_key = {norm: key for key, norm in self.entries}
+        self.norm_texts = list(self.norm_to_key)
+        self.keywords = KeywordMatrix([{w for w in norm.split() if len(w) > 2} for _, norm in self.entries],
+                                      keyword_weighting, vocabulary)
+        self.fuzzy = make_matcher(self.norm_texts, fuzzy_backend)
+        # Built by match_substring on the first lookup that needs it (it dwarfs the rest of the build)
+        self.substring = None
+        # Only built when the optional stage is on; match_semantic builds it on demand otherwise
+        self.semantic = self.build_semantic() if SEMANTIC_THRESHOLD is not None else None
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != "uid"}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.uid = next(OptionIndex._uids)  # a loaded index is new to this process's match cache
+
+    def build_substring(self):
+        """The substring automata, for a node with more than SUBSTRING_SCAN_MAX options."""
+        return SubstringMatcher([norm for _, norm in self.entries])
+
+    def build_semantic(self):
+        """Embeddings of each option's semantic_text, so the topic of an answer counts too."""
+        return SemanticMatcher([normalize(semantic_text(opt)) for opt in self.options.values()])
+
+
+def semantic_text(option):
+    """
+    What the semantic stage embeds for an option: its text and response, and those of
+    the options it leads to. Options back to the main menu get nothing; the other
+    stages and the 'menu' command cover them.
+    """
+    if option.get("goto") == "main_menu":
+        return ""
+    parts = [option["text"], option.get("response", "")]
+    menu = option["followup"] if "followup" in option else option if "options" in option else None
+    if menu is not None:
+        for sub in menu["options"].values():
+            if sub.get("goto") != "main_menu":
+                parts += (sub["text"], sub.get("response", ""))
+    return " ".join(parts)
+
+
+def compile_tree(root, fuzzy_backend=None, keyword_weighting="count", skip=()):
+    """
+    Walk the conversation tree once and attach an OptionIndex to every node with options,
+    and pre-render every option's reply (see render_reply).
+    fuzzy_backend picks the typo matcher by name (see fuzzy.FUZZY_BACKENDS) and
+    keyword_weighting the keyword scoring ("count" or "tfidf", see keywords.KeywordMatrix).
+    skip holds the id() of nodes compiled already; they and everything below them are left as is.
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if id(node) in skip:
+            continue
+        node["_index"] = OptionIndex(node["options"], fuzzy_backend, keyword_weighting)
+        for option in node["options"].values():
+            render_reply(option)
+            if "followup" in option:
+                stack.append(option["followup"])
+            elif "options" in option:
+                stack.append(option)
+    return root
+
+
+def resolve_path(root, path):
+    """Follow a sequence of option keys from root and return the menu node it leads to."""
+    node = root
+    for key in path:
+        option = node["options"][key]
+        if "followup" in option:
+            node = option["followup"]
+        elif "options" in option:
+            node = option
+        else:
+            raise KeyError(f"Option {key!r} does not lead to another menu")
+    return node
+
+
+def render_reply(option):
+    """(plain, ANSI-colored) reply line for an option, rendered once and kept on the option."""
+    reply = option.get("_reply")
+    if reply is None:
+        plain = f"\n{option.get('speaker', NARRATOR)}: {option.get('response', '')}"
+        reply = option["_reply"] = (plain, color_text(plain, option.get("color", NARRATOR_COLOR)))
+    return reply
+
+
+def get_index(node):
+    """Return the node's precomputed OptionIndex, building it if the node was never compiled."""
+    index = node.get("_index")
+    if index is None:
+        index = node["_index"] = OptionIndex(node["options"])
+    return index
+
+
+# Memoized text matches, shared by every session. None disables caching.
+MATCH_CACHE = MatchCache(maxsize=10000)
+# Longer inputs are matched but not cached: a few thousand distinct pastes of up to a
+# server line (64 KiB) each would otherwise hold hundreds of MB. Repeated inputs are short.
+CACHE_MAX_CHARS = 256
+
+
+def configure_match_cache(maxsize=10000, ttl=None):
+    """Replace the match cache with a new one (maxsize=0 turns caching off)."""
+    global MATCH_CACHE
+    MATCH_CACHE = MatchCache(maxsize, ttl) if maxsize else None
+    return MATCH_CACHE
+
+
+# Opt-in matcher instrumentation (an instrumentation.MatchStats); None means off
+INSTRUMENT = None
+
+
+def enable_instrumentation(stats=None):
+    """Start recording per-stage timings, hits and node visits into stats (a new MatchStats by default)."""
+    global INSTRUMENT
+    if stats is None:
+        from instrumentation import MatchStats
+        stats = MatchStats()
+    INSTRUMENT = stats
+    return stats
+
+
+def disable_instrumentation():
+    global INSTRUMENT
+    INSTRUMENT = None
+
+
+# Similarity an option needs for the optional semantic stage; None means the stage is off
+SEMANTIC_THRESHOLD = None
+
+
+def enable_semantic_stage(threshold=DEFAULT_THRESHOLD):
+    """
+    Add match_semantic as a fifth stage, tried when the other four find nothing.
+    Enable it before compile_tree so every node's embeddings are built at load.
+    """
+    global SEMANTIC_THRESHOLD, TEXT_STAGES
+    SEMANTIC_THRESHOLD = threshold
+    TEXT_STAGES = BASE_TEXT_STAGES + (("semantic", match_semantic),)
+    if MATCH_CACHE is not None:
+        MATCH_CACHE.invalidate()  # cached "no match" answers may match now
+
+
+def disable_semantic_stage():
+    global SEMANTIC_THRESHOLD, TEXT_STAGES
+    SEMANTIC_THRESHOLD = None
+    TEXT_STAGES = BASE_TEXT_STAGES
+    if MATCH_CACHE is not None:
+        MATCH_CACHE.invalidate()
+
+
+def match_option(user_input, options, index=None):
     """
     Match user input to the best option using:
     - Exact number
     - Exact or substring text match
     - Fuzzy match for typos
     - Keyword overlap
+    - Optionally, n-gram embedding similarity (see enable_semantic_stage)
+    Pass the node's OptionIndex to skip re-normalizing the options; text matches
+    against a precomputed index are then memoized in MATCH_CACHE.
     """
+    cache = MATCH_CACHE
+    if index is None:
+        # A throwaway index: its words stay out of the shared vocabulary
+        index = OptionIndex(options, vocabulary=Vocabulary())
+        cache = None
+    if INSTRUMENT is not None:
+        return match_instrumented(user_input, options, index, cache, INSTRUMENT)
     user_input_norm = normalize(user_input)
 
     # 1. Exact key match
+    key = match_key(user_input, options)
+    if key is not None:
+        return key
+
+    # Stages 2-4 only look at the normalized input, so that is what gets cached
+    if cache is None or len(user_input_norm) > CACHE_MAX_CHARS:
+        return match_text(user_input_norm, index)
+    cache_key = (index.uid, user_input_norm)
+    key = cache.get(cache_key)
+    if key is MISSING:
+        key = match_text(user_input_norm, index)
+        cache.put(cache_key, key)
+    return key
+
+
+def match_instrumented(user_input, options, index, cache, stats):
+    """match_option with every stage timed and reported to stats."""
+    clock = time.perf_counter
+    started = clock()
+    user_input_norm = normalize(user_input)
+    resolved = None
+    if len(user_input_norm) > CACHE_MAX_CHARS:
+        cache = None
+
+    t = clock()
+    key = match_key(user_input, options)
+    stats.record_stage("key", clock() - t, key is not None)
+    if key is not None:
+        resolved = "key"
+    else:
+        cache_key = (index.uid, user_input_norm)
+        if cache is not None:
+            t = clock()
+            key = cache.get(cache_key)
+            stats.record_stage("cache", clock() - t, key is not MISSING)
+        if cache is not None and key is not MISSING:
+            resolved = "cache" if key is not None else None
+        else:
+            key = None
+            for name, stage in TEXT_STAGES:
+                t = clock()
+                key = stage(user_input_norm, index)
+                stats.record_stage(name, clock() - t, key is not None)
+                if key is not None:
+                    resolved = name
+                    break
+            if cache is not None:
+                cache.put(cache_key, key)
+    stats.record_match(resolved, clock() - started)
+    return key
+
+
+def match_key(user_input, options):
+    """Stage 1: the input is an option key, possibly with leading zeros."""
     if user_input in options:
         return user_input
     if user_input.isdigit():
         user_key = str(int(user_input))
         if user_key in options:
             return user_key
+    return None
+
 
-    # 2. Exact or partial text match
-    for key, option in options.items():
-        opt_norm = normalize(option['text'])
+def match_substring(user_input_norm, index):
+    """Stage 2: exact or partial text match; the earliest matching option wins."""
+    if len(index.entries) > index.SUBSTRING_SCAN_MAX:
+        if index.substring is None:
+            index.substring = index.build_substring()
+        pos = index.substring.first(user_input_norm)
+        return None if pos is None else index.keys[pos]
+    for key, opt_norm in index.entries:
         if user_input_norm == opt_norm or user_input_norm in opt_norm or opt_norm in user_input_norm:
             return key
+    return None
 
-    # 3. Fuzzy match
-    norm_to_key = {normalize(opt['text']): key for key, opt in options.items()}
-    close = get_close_matches(user_input_norm, list(norm_to_key.keys()), n=1, cutoff=0.8)
-    if close:
-        return norm_to_key[close[0]]
-
-    # 4. Keyword overlap
-    user_words = set(user_input_norm.split())
-    keyword_matches = []
-    for key, option in options.items():
-        opt_keywords = extract_keywords(option['text'])
-        overlap = user_words & opt_keywords
-        if overlap:
-            keyword_matches.append((key, len(overlap)))
-    if keyword_matches:
-        keyword_matches.sort(key=lambda x: -x[1])
-        return keyword_matches[0][0]
 
+def match_fuzzy(user_input_norm, index):
+    """Stage 3: fuzzy match for typos."""
+    close = index.fuzzy.best(user_input_norm, cutoff=0.8)
+    if close is not None:
+        return index.norm_to_key[close]
+    return None
+
+
+def match_keywords(user_input_norm, index):
+    """Stage 4: keyword overlap."""
+    best = index.keywords.best(set(user_input_norm.split()))
+    if best is not None:
+        return index.keys[best]
+    return None
+
+
+def match_semantic(user_input_norm, index):
+    """Stage 5 (optional): the option most similar to the input by n-gram embedding."""
+    if index.semantic is None:
+        index.semantic = index.build_semantic()
+    best = index.semantic.best(user_input_norm, SEMANTIC_THRESHOLD)
+    if best is not None:
+        return index.keys[best]
+    return None
+
+
+# Stages 2-4, tried in order; enable_semantic_stage() adds stage 5
+TEXT_STAGES = BASE_TEXT_STAGES = (
+    ("substring", match_substring),
+    ("fuzzy", match_fuzzy),
+    ("keywords", match_keywords),
+)
+
+
+def match_text(user_input_norm, index):
+    """Stages 2-4 (and 5, when enabled) of match_option, for input that is not an option key."""
+    for _, stage in TEXT_STAGES:
+        key = stage(user_input_norm, index)
+        if key is not None:
+            return key
     # No match
     return None
 
 
-def run_conversation(node, main_menu):
+# Session states
+CHOOSING = "choosing"   # waiting for an option from the current node's menu
+LEAF = "leaf"           # a topic ended; waiting for 'menu' or 'exit'
+FINISHED = "finished"   # the user left
+
+
+class NavigationStack:
     """
-    Navigate the conversation tree, printing responses and options, and handling user input.
-    Allows returning to the main menu when specified.
-    Returns True if the user wants to exit, otherwise False.
+    Where a session is in the tree: the option keys followed from the starting node.
+    Holds one (key, node) frame per level, so its size is bounded by the tree depth
+    no matter how long the session runs.
+    """
+
+    __slots__ = ("main_menu", "start", "frames")
+
+    def __init__(self, main_menu, start=None):
+        self.main_menu = main_menu
+        self.start = main_menu if start is None else start
+        self.frames = []
+
+    @property
+    def node(self):
+        return self.frames[-1][1] if self.frames else self.start
+
+    @property
+    def path(self):
+        return tuple(key for key, _ in self.frames)
+
+    def push(self, key, node):
+        self.frames.append((key, node))
+
+    def goto(self, path):
+        """Jump to the node reached by following path (option keys) from the main menu."""
+        frames, node = [], self.main_menu
+        for key in path:
+            option = node["options"][key]
+            node = option["followup"] if "followup" in option else option
+            if "options" not in node:
+                raise KeyError(f"Option {key!r} does not lead to another menu")
+            frames.append((key, node))
+        self.start = self.main_menu
+        self.frames = frames
+
+    def reset(self):
+        """Go back to the main menu."""
+        self.start = self.main_menu
+        self.frames.clear()
+
+
+class ConversationSession:
+    """
+    One user's conversation as an explicit state machine.
+    It never reads or prints anything itself: feed it the user's input with send()
+    and show the lines it returns (replies ANSI-colored if color is set, as for
+    render.Renderer.color). Give it a history.HistoryLog to record every turn
+    under session_id.
     """
-    while True:
-        print("\n" + node["prompt"])
+
+    def __init__(self, main_menu, node=None, session_id=None, history=None, color=True):
+        self.stack = NavigationStack(main_menu, node)
+        self.state = CHOOSING
+        self.session_id = session_id
+        self.history = history
+        self.color = color
+
+    @classmethod
+    def restore(cls, main_menu, path, state=CHOOSING, session_id=None, history=None, color=True):
+        """Rebuild a session from a saved path of option keys (back at the main menu if it no longer exists)."""
+        session = cls(main_menu, session_id=session_id, history=history, color=color)
+        try:
+            session.stack.goto(path)
+            session.state = state
+        except KeyError:
+            pass
+        return session
+
+    @property
+    def node(self):
+        return self.stack.node
+
+    def migrate(self, main_menu):
+        """Move to another version of the tree by the same path of option keys (or its main menu if the path is gone)."""
+        path = self.stack.path
+        self.stack = NavigationStack(main_menu)
+        try:
+            self.stack.goto(path)
+        except KeyError:
+            self.state = CHOOSING
+
+    @property
+    def finished(self):
+        return self.state == FINISHED
+
+    def menu(self):
+        """Lines showing the current node's prompt and options."""
+        node = self.node
+        lines = ["\n" + node["prompt"]]
         for key, option in node["options"].items():
-         emoji = "👉"
-         if "dumpling" in option['text'].lower(): emoji = "🥟"
-         elif "return" in option['text'].lower(): emoji = "🔙"
-         elif "motivation" in option['text'].lower(): emoji = "💡"
-         elif "kung fu" in option['text'].lower(): emoji = "🥋"
-         elif "talk" in option['text'].lower(): emoji = "🗣️"
-         print(f"{emoji} {key}. {option['text']}")
+            lines.append(f"{option.get('emoji', DEFAULT_EMOJI)} {key}. {option['text']}")
+        return lines
+
+    def input_prompt(self):
+        if self.state == LEAF:
+            return "Type 'menu' to switch characters, or 'exit' to quit: "
+        return "Your choice (or type 'switch', 'restart', or 'exit'): "
 
+    def send(self, user_input):
+        """Advance the conversation by one user input and return the lines to show."""
+        node = self.node
+        if self.state == LEAF:
+            lines = self._after_leaf(user_input)
+        else:
+            lines = self._choose(user_input)
+        if INSTRUMENT is not None and self.node is not node:
+            INSTRUMENT.record_visit(self.stack.path)
+        if self.history is not None:
+            self.history.append(self.session_id, user_input, self.stack.path, self.state, self.finished)
+        return lines
 
-        choice_raw = input("Your choice (or type 'switch', 'restart', or 'exit'): ").strip()
+    def _choose(self, user_input):
+        choice_raw = user_input.strip()
         choice_norm = normalize(choice_raw)
 
         if choice_norm == "exit":
-         print("👋 Thank you for chatting! Skadoosh and stay awesome!")
-         return True
+            self.state = FINISHED
+            return ["👋 Thank you for chatting! Skadoosh and stay awesome!"]
 
         if choice_norm == "restart":
-         print("🔁 Restarting conversation...")
-         return run_conversation(main_menu, main_menu)
+            self.stack.reset()
+            return ["🔁 Restarting conversation..."]
 
         if choice_norm == "switch":
-         print("🔄 Switching characters...")
-         return run_conversation(main_menu, main_menu)
-
-        choice_norm = normalize(choice_raw)
-        if choice_norm == "exit":
-            print("Thank you for chatting! Skadoosh and stay awesome!")
-            return True  # Signal to exit
+            self.stack.reset()
+            return ["🔄 Switching characters..."]
 
         # Use enhanced matching to find the best-fitting option
-        matched_key = match_option(choice_raw, node["options"])
-        if matched_key:
-            selected = node["options"][matched_key]
+        node = self.node
+        matched_key = match_option(choice_raw, node["options"], get_index(node))
+        if not matched_key:
+            return ["\nInvalid choice. Please try again."]
+        selected = node["options"][matched_key]
+
+        plain, colored = render_reply(selected)
+        lines = [colored if self.color else plain]
+
+        if "followup" in selected:
+            self.stack.push(matched_key, selected["followup"])
+        elif selected.get("goto") == "main_menu":
+            self.stack.reset()
+        elif "options" in selected:
+            self.stack.push(matched_key, selected)
         else:
-            print("\nInvalid choice. Please try again.")
-            continue
+            lines.append("\n💬 That’s all I have to share on that topic.")
+            self.state = LEAF
+        return lines
 
-        def detect_speaker(response_text):
-            text = response_text.lower()
-            if "dumpling" in text or "skadoosh" in text or "po" in text or "dragon" in text or "2" in text:
-                return "🐼 Po"
-            elif "nation" in text or "youth" in text or "missile" in text or "1" in text or "apj abdul kalam" in text:
-                        return "🇮🇳 Dr. Kalam"
-            elif "web" in text or "spider" in text or "swing" in text or "3" in text:
-                return "🕷️ Spider-Man"
-            else:
-                return "💬 Chatbot"
+    def _after_leaf(self, user_input):
+        next_action = user_input.strip().lower()
+        self.state = CHOOSING
+        if next_action == "menu":
+            self.stack.reset()
+        elif next_action == "exit":
+            self.state = FINISHED
+            return ["👋 Goodbye!"]
+        return []
 
-        speaker = detect_speaker(selected.get("response", ""))
-        color = "33" if "🐼" in speaker else "32" if "🇮🇳" in speaker else "31"
-        print(color_text(f"\n{speaker}: {selected.get('response', '')}", color))
 
+def run_conversation(node, main_menu, renderer=None, read=input):
+    """
+    Navigate the conversation tree, printing responses and options, and handling user input.
+    Allows returning to the main menu when specified.
+    Output goes to renderer (the terminal by default) and is flushed once per turn,
+    just before read() asks for the next input.
+    Returns True once the user exits.
+    """
+    if renderer is None:
+        renderer = terminal_renderer()
+    session = ConversationSession(main_menu, node, color=renderer.color)
+    while not session.finished:
+        if session.state == CHOOSING:
+            renderer.emit(session.menu())
+        renderer.flush()
+        renderer.emit(session.send(read(session.input_prompt())))
+    renderer.flush()
+    return True
 
 
-        
-        if "followup" in selected:
-            if run_conversation(selected["followup"], main_menu):
-                return True
-        elif selected.get("text", "").lower() == "return to main menu":
-            if run_conversation(main_menu, main_menu):
-                return True
-        elif "options" in selected:
-            if run_conversation(selected, main_menu):
-                return True
-        else:
-            print("\n💬 That’s all I have to share on that topic.")
-            next_action = input("Type 'menu' to switch characters, or 'exit' to quit: ").strip().lower()
-            if next_action == "menu":
-                return run_conversation(main_menu, main_menu)
-            elif next_action == "exit":
-                print("👋 Goodbye!")
-                return True
-
-
-
-# Main conversation tree with character selection
-chatbot = {
-    "prompt": "Welcome to the Ultimate Chatbot Experience! Choose a character to chat with:",
-    "options": {
-        "1": {
-            "text": "APJ Abdul Kalam",
-            "response": "Good evening, my young friend. I am happy to meet you. It gives me joy to interact with the youth—you are the future of our nation.",
-            "followup": {
-                "prompt": "What would you like to talk about?",
-                "options": {
-                    "1": {
-                        "text": "Your achievements",
-                        "response": "Achievements are the result of continuous effort and purpose. I am proud of contributing to India's space and defense programs—like the SLV-III launch and the Pokhran nuclear tests. But I consider inspiring young minds my greatest achievement."
-                    },
-                    "2": {
-                        "text": "Motivation during challenges",
-                        "response": "Challenges test our vision and courage. I stayed motivated by thinking of my nation. When your goal is bigger than your fear, you keep moving forward.",
-                        "followup": {
-                            "prompt": "Would you like to:",
-                            "options": {
-                                "1": {
-                                    "text": "Hear how I overcame failure",
-                                    "response": "I once missed becoming a fighter pilot by just one spot. I was heartbroken. But failure redirected me to science and space. Failure is not the opposite of success—it is part of it."
-                                },
-                                "2": {
-                                    "text": "Ask about my childhood",
-                                    "response": "I was born in Rameswaram, Tamil Nadu. My father was a boat owner with little formal education, but much wisdom. I used to sell newspapers to support our family. Those simple days taught me discipline, humility, and the value of education."
-                                },
-                                "3": {
-                                    "text": "Return to main menu"
-                                }
-                            }
-                        }
-                    },
-                    "3": {
-                        "text": "Advice for young people",
-                        "response": "My dear young friend, you have immense power. If you combine knowledge, integrity, and compassion, nothing can stop you. Work hard, dream big, and always stay humble.",
-                        "followup": {
-                            "prompt": "Would you like to:",
-                            "options": {
-                                "1": {
-                                    "text": "Hear a quote about dreams",
-                                    "response": "\"Dreams are not what you see when you sleep. Dreams are what keep you awake.\"",
-                                    "followup": {
-                                        "prompt": "What is your dream?",
-                                        "options": {
-                                            "1": {
-                                                "text": "To serve the nation",
-                                                "response": "That is a noble dream. Serve through your knowledge, kindness, and responsibility. Nation-building starts with character-building."
-                                            },
-                                            "2": {
-                                                "text": "To become a scientist",
-                                                "response": "Excellent! Science is about curiosity and perseverance. Start learning deeply, ask questions, and solve problems that help society."
-                                            },
-                                            "3": {
-                                                "text": "I’m still discovering it",
-                                                "response": "That’s perfectly okay. Exploration is part of life. Be curious, stay open, and your path will reveal itself. Purpose is not found—it’s created."
-                                            }
-                                        }
-                                    }
-                                },
-                                "2": {
-                                    "text": "Know how I became President",
-                                    "response": "I never aimed to become President. I focused on serving through science. My dedication to the nation brought me that honor. Focus on contribution, and recognition will follow."
-                                },
-                                "3": {
-                                    "text": "Return to main menu"
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "2": {
-            "text": "Po, the Dragon Warrior",
-            "response": "Whoa! You know my name? That’s awesome! Yes! Po, the Dragon Warrior, at your service! What can I do for ya?",
-            "followup": {
-                "prompt": "What do you want to talk about?",
-                "options": {
-                    "1": {
-                        "text": "What’s it like being the Dragon Warrior?",
-                        "response": "Oh man, it’s amazing. Kung fu, dumplings, saving the Valley of Peace… but exhausting! I still can’t feel my legs from yesterday’s training.",
-                        "followup": {
-                            "prompt": "What's next?",
-                            "options": {
-                                "1": {
-                                    "text": "Do you still help your dad at the noodle shop?",
-                                    "response": "Of course! I serve up wisdom and noodles. My dad says, “A warrior without soup is just a guy in pajamas.”",
-                                    "followup": {
-                                        "prompt": "What's next?",
-                                        "options": {
-                                            "1": {
-                                                "text": "What’s your favorite noodle dish?",
-                                                "response": "Spicy tofu ramen with extra chili oil and bean sprouts... oh man, now I’m hungry again."
-                                            },
-                                            "2": {
-                                                "text": "Do customers recognize you?",
-                                                "response": "All the time! Some ask for autographs... others just ask for extra dumplings. I’m cool with both."
-                                            },
-                                            "3": {
-                                                "text": "What does your dad think of your kung fu career?",
-                                                "response": "He’s proud, but he still calls me his “Little Dumpling.” In front of everyone. Thanks, Dad."
-                                            },
-                                            "4": {
-                                                "text": "Return to main menu"
-                                            }
-                                        }
-                                    }
-                                },
-                                "2": {
-                                    "text": "That sounds intense. Do you ever get time off?",
-                                    "response": "Only when I sneak it! But don’t tell Shifu. Sometimes I hide behind the training dummies and nap."
-                                },
-                                "3": {
-                                    "text": "What’s your favorite part of being the Dragon Warrior?",
-                                    "response": "Hmmm… Either protecting the valley... or the dumplings after! Maybe both? Dumplings of destiny!"
-                                },
-                                "4": {
-                                    "text": "Return to main menu"
-                                }
-                            }
-                        }
-                    },
-                    "2": {
-                        "text": "Are you really the Po from the Jade Palace?",
-                        "response": "The one and only! Big belly, big heart, big... appetite. And also, kung fu skills. Skadoosh!",
-                        "followup": {
-                            "prompt": "What's next?",
-                            "options": {
-                                "1": {
-                                    "text": "Do you still hang out with the Furious Five?",
-                                    "response": "Totally! Tigress is still serious, Monkey pranks too much, and Mantis... talks a lot for a tiny guy.",
-                                    "followup": {
-                                        "prompt": "What's next?",
-                                        "options": {
-                                            "1": {
-                                                "text": "Who’s the strongest out of all of you?",
-                                                "response": "Ooh, tough one! Tigress is super strong, but I’ve got the power of destiny! And, you know, snacks."
-                                            },
-                                            "2": {
-                                                "text": "Do you ever fight alongside them?",
-                                                "response": "All the time! We’re like a dumpling—each ingredient adds flavor. Also, explosions."
-                                            },
-                                            "3": {
-                                                "text": "Have you ever had a big argument with one of them?",
-                                                "response": "Once I ate all the training snacks and blamed Monkey. It was a dark day... for my honor."
-                                            },
-                                            "4": {
-                                                "text": "Return to main menu"
-                                            }
-                                        }
-                                    }
-                                },
-                                "2": {
-                                    "text": "Do you ever get scared during battles?",
-                                    "response": "Oh yeah! Scared, sweaty, sometimes shaky. But then I remember: even pandas can be legends.",
-                                    "followup": {
-                                        "prompt": "What's next?",
-                                        "options": {
-                                            "1": {
-                                                "text": "What was your scariest fight?",
-                                                "response": "Definitely when I faced Tai Lung. That dude was all claws and rage. I thought I was toast. Tasty, terrified toast."
-                                            },
-                                            "2": {
-                                                "text": "How do you handle fear?",
-                                                "response": "I breathe, I believe in myself... and sometimes I pretend the villain is a giant dumpling. It weirdly works."
-                                            },
-                                            "3": {
-                                                "text": "Do you eat before or after a battle?",
-                                                "response": "Both. Pre-battle dumpling = energy. Post-battle dumpling = victory. Mid-battle? Eh, risky but possible."
-                                            },
-                                            "4": {
-                                                "text": "Return to main menu"
-                                            }
-                                        }
-                                    }
-                                },
-                                "3": {
-                                    "text": "Can you teach me kung fu?",
-                                    "response": "Whoa! A future warrior! I like it. We’ll start with stretches... and maybe a warm-up snack.",
-                                    "followup": {
-                                        "prompt": "What's next?",
-                                        "options": {
-                                            "1": {
-                                                "text": "Do you have any advice?",
-                                                "response": "Oh, I’ve got advice, life lessons, and fortune-cookie wisdom! Step one: believe in YOU."
-                                            },
-                                            "2": {
-                                                "text": "Let’s train!",
-                                                "response": "Yes! Stretch those arms, channel your chi, and try not to trip on your shoelaces."
-                                            },
-                                            "3": {
-                                                "text": "I could go for dumplings right now!",
-                                                "response": "Me too! Let’s grab a bucket—yes, a bucket—of dumplings. I know just the spot."
-                                            },
-                                            "4": {
-                                                "text": "Return to main menu"
-                                            }
-                                        }
-                                    }
-                                },
-                                "4": {
-                                    "text": "Return to main menu"
-                                }
-                            }
-                        }
-                    },
-                    "3": {
-                        "text": "Return to main menu"
-                    }
-                }
-            }
-        },
-        "3": {
-            "text": "Spider-Man",
-            "response": "Yo, it’s your friendly neighborhood Spider-Man, swinging into your day! Just finished patrolling NYC, and now I’m here for you. What’s up, pal?",
-            "followup": {
-                "prompt": "What do you want to talk about?",
-                "options": {
-                    "1": {
-                        "text": "Tell me about being Spider-Man",
-                        "response": "Being Spider-Man? It’s a wild ride! Swinging through skyscrapers, stopping bad guys, and occasionally getting stuck in my own webs. With great power comes great responsibility, you know?"
-                    },
-                    "2": {
-                        "text": "I’m feeling kinda down",
-                        "response": "Aw, man, I’ve been there. Even Spider-Man has rough days. Wanna talk about it?",
-                        "followup": {
-                            "prompt": "What would you like to do?",
-                            "options": {
-                                "1": {
-                                    "text": "How do you deal with it?",
-                                    "response": "Okay, true story: when I’m down, I swing to the top of the Empire State Building and just... breathe. Also, music or sketching helps. What do you do to feel better?",
-                                    "followup": {
-                                        "prompt": "You mentioned you like some activities. What's your thing?",
-                                        "options": {
-                                            "1": {
-                                                "text": "I like drawing or listening to music",
-                                                "response": "Dude, that’s awesome! Drawing’s like, your superpower. And music? Total vibe-lifter. Wanna share more?",
-                                                "followup": {
-                                                    "prompt": "What's next?",
-                                                    "options": {
-                                                        "1": {
-                                                            "text": "Share a drawing idea",
-                                                            "response": "A drawing idea? Love it! How about sketching me swinging between buildings with a pizza in one hand? True story, I’ve done that."
-                                                        },
-                                                        "2": {
-                                                            "text": "Your favourite music",
-                                                            "response": "A music lover, huh? I blast classic rock when I’m swinging—think AC/DC or some chill lo-fi when I’m chilling on a rooftop."
-                                                        },
-                                                        "3": {
-                                                            "text": "You’re making me feel better already!",
-                                                            "response": "Heck yeah, that’s what your friendly neighborhood Spider-Man’s here for! Wanna hear a funny story about me saving a cat from a tree?",
-                                                            "followup": {
-                                                                "prompt": "What's next?",
-                                                                "options": {
-                                                                    "1": {
-                                                                        "text": "Tell the cat story!",
-                                                                        "response": "Alright, picture this: I’m swinging through Queens, and this cat’s stuck in a tree, hissing like it’s MY fault. I climb up, get scratched, and then it JUMPS into my arms. Total drama queen. Got a pet story of your own?",
-                                                                        "followup": {
-                                                                            "prompt": "You got a pet story?",
-                                                                            "options": {
-                                                                                "1": {
-                                                                                    "text": "I have a dog who’s always getting into trouble",
-                                                                                    "response": "A troublemaking dog? That’s my kinda sidekick! Tell me more—what’s the wildest thing your dog’s done?"
-                                                                                },
-                                                                                "2": {
-                                                                                    "text": "No pets, but I love animals!",
-                                                                                    "response": "Nice! Animals are the best. I once webbed a pigeon to save it from a hawk. Felt like a hero... until it pooped on me."
-                                                                                },
-                                                                                "3": {
-                                                                                    "text": "Return to main menu"
-                                                                                }
-                                                                            }
-                                                                        }
-                                                                    },
-                                                                    "2": {
-                                                                        "text": "How about a Spider-Man joke?",
-                                                                        "response": "A joke? Here’s one: Why did I get stuck fighting Electro? Because my web-shooters got a bad CHARGE!"
-                                                                    },
-                                                                    "3": {
-                                                                        "text": "Return to main menu"
-                                                                    }
-                                                                }
-                                                            }
-                                                        },
-                                                        "4": {
-                                                            "text": "Return to main menu"
-                                                        }
-                                                    }
-                                                }
-                                            },
-                                            "2": {
-                                                "text": "Return to main menu"
-                                            }
-                                        }
-                                    }
-                                },
-                                "2": {
-                                    "text": "Tell me about a time you felt like this",
-                                    "response": "Oh, man, I’ve had those days. Like when I flunked a chem test AND got yelled at by JJ for late photos. I just swung around, ate some pizza, and reminded myself: tomorrow’s a new swing."
-                                },
-                                "3": {
-                                    "text": "Just keep cheering me up!",
-                                    "response": "You got it, pal! You’re tougher than a Rhino charge. How about a quick swing around the city in your mind? Picture us zipping past Times Square!"
-                                },
-                                "4": {
-                                    "text": "Return to main menu"
-                                }
-                            }
-                        }
-                    },
-                    "3": {
-                        "text": "Return to main menu"
-                    }
-                }
-            }
-        }
-    }
-}
+def load_engine(menu_path, snapshot_path=None):
+    """
+    Return the compiled conversation tree for a menu file (see compile_tree).
+    It comes from the snapshot next to the menu file while that still matches the
+    scripts (see snapshot.py), with each followup menu left unloaded until it is
+    first visited; otherwise the scripts are compiled and the snapshot
+    rewritten, or only kept in memory if it can't be written there.
+    """
+    if snapshot_path is None:
+        snapshot_path = os.path.splitext(menu_path)[0] + ".snapshot"
+    settings = (DEFAULT_BACKEND, "count", SEMANTIC_THRESHOLD is not None)
+    tree = snapshot.load(snapshot_path, OptionIndex, settings)
+    if tree is not None:
+        return tree
+    tree = compile_tree(load_json_tree(menu_path))
+    try:
+        snapshot.save(snapshot_path, tree, script_sources(menu_path), OptionIndex, settings)
+    except OSError:
+        pass
+    return tree
+
+
+# Main conversation tree with character selection, loaded from the scripts/ folder
+# with every node's OptionIndex already built (from scripts/menu.snapshot when it is current,
+# where each followup subtree is only unpickled once a session navigates into it).
+SCRIPTS_MENU = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts", "menu.json")
+chatbot = load_engine(SCRIPTS_MENU)
+
 
 # Run the chatbot
-print("Welcome to the Ultimate Chatbot Experience!")
-run_conversation(chatbot, chatbot)
+if __name__ == "__main__":
+    print("Welcome to the Ultimate Chatbot Experience!")
+    run_conversation(chatbot, chatbot)
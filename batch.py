@@ -0,0 +1,117 @@
+"""
+Headless batch evaluation: resolve a JSONL file of utterances against the chatbot tree.
+
+Each input line is a record like {"path": ["2", "1"], "utterance": "do you eat before battle"},
+where path is the list of option keys leading from the main menu to the node being asked.
+Each output line adds the matched key and the speaker label of its response:
+{"path": [...], "utterance": "...", "key": "3", "speaker": "🐼 Po"}
+Records that cannot be resolved get an "error" field instead.
+
+Usage: python batch.py utterances.jsonl -o results.jsonl --workers 8 --chunk-size 2000
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from Main import chatbot, get_index, match_option, resolve_path
+
+
+def resolve_record(record, root=chatbot):
+    """Match one {"path", "utterance"} record and return the result record."""
+    path = record.get("path", [])
+    utterance = record.get("utterance", "")
+    result = {"path": path, "utterance": utterance}
+    if not isinstance(path, list) or not all(isinstance(key, str) for key in path):
+        # A string would otherwise be walked one character at a time ("12" as ["1", "2"])
+        result["error"] = "bad path: expected a list of option keys"
+        return result
+    try:
+        node = resolve_path(root, path)
+    except (KeyError, TypeError) as e:
+        result["error"] = f"bad path: {e}"
+        return result
+    key = match_option(utterance, node["options"], get_index(node))
+    result["key"] = key
+    result["speaker"] = node["options"][key].get("speaker") if key else None
+    return result
+
+
+def resolve_lines(lines):
+    """Resolve a chunk of raw JSONL lines, returning the output lines. Runs in the workers."""
+    out = []
+    for line in lines:
+        try:
+            result = resolve_record(json.loads(line))
+        except (ValueError, AttributeError) as e:
+            result = {"line": line.rstrip("\n"), "error": f"bad record: {e}"}
+        out.append(json.dumps(result, ensure_ascii=False) + "\n")
+    return out
+
+
+def read_chunks(lines, chunk_size):
+    """Group non-blank lines into lists of chunk_size without reading ahead."""
+    lines = (line for line in lines if line.strip())
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_batch(infile, outfile, workers=None, chunk_size=1000, max_pending=None):
+    """
+    Stream records from infile to outfile, preserving order.
+    At most max_pending chunks are in flight at once (default: twice the worker count),
+    so memory stays bounded however large the input is. workers=0 runs in-process.
+    Returns the number of records written.
+    """
+    written = 0
+    if workers == 0:
+        for chunk in read_chunks(infile, chunk_size):
+            outfile.writelines(resolve_lines(chunk))
+            written += len(chunk)
+        return written
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in read_chunks(infile, chunk_size):
+            pending.append(pool.submit(resolve_lines, chunk))
+            if len(pending) >= max_pending:
+                done = pending.popleft().result()
+                outfile.writelines(done)
+                written += len(done)
+        while pending:
+            done = pending.popleft().result()
+            outfile.writelines(done)
+            written += len(done)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resolve a JSONL file of utterances against the chatbot tree.")
+    parser.add_argument("input", help="JSONL file of {path, utterance} records, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="where to write results (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count, 0 = no pool)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="records sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    infile = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    outfile = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        count = run_batch(infile, outfile, args.workers, args.chunk_size)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    print(f"Resolved {count} records.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Benchmarks for the matcher and the conversation engine.
+
+Covers normalize, extract_keywords, each match_option stage on its own, building the
+match index, and end-to-end conversations driven by canned input. The real chatbot
+tree is used, plus synthetic trees with 10 / 100 / 1,000 / 10,000 options per node.
+Each benchmark reports throughput, p50/p99 latency and peak traced memory.
+
+    python benchmarks/bench.py                       # run and compare with baseline.json
+    python benchmarks/bench.py --save-baseline       # record a new baseline
+    python benchmarks/bench.py --sizes 10 100 --threshold 0.5
+
+A run fails (exit status 1) when any benchmark's p50 latency or peak memory is more
+than --threshold (default 25%) above the baseline, or its throughput that much below.
+Baselines are machine specific: record them on the machine that runs the comparison.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Main  # noqa: E402
+from dialogue import resolve_metadata  # noqa: E402
+from Main import (ConversationSession, OptionIndex, compile_tree, extract_keywords,  # noqa: E402
+                  match_fuzzy, match_key, match_keywords, match_substring, normalize)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+SEED = 1234
+
+
+def make_vocabulary(rng, size=400):
+    syllables = ["ka", "lo", "mi", "po", "ra", "shi", "tu", "ven", "dra", "gon", "fu", "nda", "spi", "der", "web", "ion"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+def synthetic_tree(options_per_node, seed=SEED):
+    """A main menu of options_per_node options, three of which open menus of the same size."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+
+    def sentence():
+        return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(2, 8))).capitalize() + "?"
+
+    def menu(prompt, depth):
+        options = {}
+        for i in range(1, options_per_node + 1):
+            option = {"text": sentence(), "response": sentence()}
+            if depth == 0 and i <= 3:
+                option["followup"] = menu(f"Topic {i}", depth + 1)
+            options[str(i)] = option
+        if depth:
+            options[str(options_per_node + 1)] = {"text": "Return to main menu"}
+        return {"prompt": prompt, "options": options}
+
+    return resolve_metadata(menu("Pick a topic:", 0))
+
+
+def typo(text, rng):
+    chars = list(text)
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(chars))
+        chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+
+def make_inputs(node, rng, count=200):
+    """Canned inputs of each kind for one node."""
+    keys = list(node["options"])
+    texts = [node["options"][key]["text"] for key in keys]
+    words = " ".join(texts).split()
+    return {
+        "keys": [rng.choice(keys) for _ in range(count)],
+        "texts": [rng.choice(texts) for _ in range(count)],
+        "typos": [normalize(typo(rng.choice(texts), rng)) for _ in range(count)],
+        "phrases": [normalize(" ".join(rng.choice(words) for _ in range(rng.randint(2, 5)))) for _ in range(count)],
+    }
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(func, args_list, budget=0.5, max_calls=20000, min_calls=5, rounds=3):
+    """
+    Time func over args_list (cycling) until the time budget is spent; then trace its memory.
+    Very fast calls are timed in batches of at least ~20us so timer overhead doesn't
+    dominate; each sample is the batch's mean latency. The budget is split over several
+    rounds and the quietest round (lowest p50) is reported, to damp machine noise.
+    """
+    batch = 1
+    t0 = time.perf_counter_ns()
+    func(*args_list[0])
+    first = time.perf_counter_ns() - t0
+    if first < 20_000:
+        batch = min(1000, 20_000 // max(first, 1) + 1)
+
+    for args in args_list[:min_calls * batch]:  # warm up caches and lazily built state
+        func(*args)
+
+    best = None
+    for _ in range(rounds):
+        samples, calls, total_ns = [], 0, 0
+        gc.collect()
+        started = time.perf_counter()
+        while calls < max_calls and (calls < min_calls or time.perf_counter() - started < budget / rounds):
+            batch_args = [args_list[(calls + j) % len(args_list)] for j in range(batch)]
+            t0 = time.perf_counter_ns()
+            for args in batch_args:
+                func(*args)
+            elapsed = time.perf_counter_ns() - t0
+            samples.append(elapsed / batch)
+            calls += batch
+            total_ns += elapsed
+        samples.sort()
+        if best is None or percentile(samples, 0.50) < percentile(best[0], 0.50):
+            best = (samples, calls, total_ns)
+    samples, calls, total_ns = best
+
+    tracemalloc.start()
+    for args in args_list[:min(len(args_list), 20)]:
+        func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "calls": calls,
+        "ops_per_sec": calls / (total_ns / 1e9) if total_ns else 0.0,
+        "p50_us": percentile(samples, 0.50) / 1000,
+        "p99_us": percentile(samples, 0.99) / 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+def converse(root, inputs):
+    """Drive one session through canned inputs, as run_conversation would."""
+    session = ConversationSession(root)
+    for text in inputs:
+        if session.state == Main.CHOOSING:
+            session.menu()
+        session.send(text)
+        if session.finished:
+            session = ConversationSession(root)
+
+
+def chatbot_script():
+    """A canned walk through every character of the real chatbot."""
+    return (["2", "1", "1", "2", "menu", "2", "2", "2", "how do you handle fear", "x", "exit"] +
+            ["1", "motivation", "1", "menu", "1", "3", "1", "3", "menu"] +
+            ["spider man", "i'm feeling kinda down", "How do you deal with it?", "1", "3", "1", "2", "menu"] +
+            ["restart", "switch", "dragon warior", "return to main menu", "exit"])
+
+
+def run_benchmarks(sizes, budget):
+    rng = random.Random(SEED)
+    results = {}
+    Main.configure_match_cache(0)  # measure the matcher itself, not the cache
+
+    sample = [(text,) for text in make_inputs(synthetic_tree(10), rng)["texts"] + ["  Hello, World!!  ", "1"]]
+    results["normalize"] = measure(normalize, sample, budget)
+    results["extract_keywords"] = measure(extract_keywords, sample, budget)
+
+    script = chatbot_script()
+    results["e2e[chatbot]"] = measure(converse, [(Main.chatbot, script)], budget)
+
+    for size in sizes:
+        tree = synthetic_tree(size)
+        node = tree["options"]["1"]["followup"]
+        results[f"index_build[n={size}]"] = measure(OptionIndex, [(node["options"],)], budget, max_calls=50, min_calls=2,
+                                                   rounds=1 if size >= 10000 else 3)
+        compile_tree(tree)
+        index = node["_index"]
+        inputs = make_inputs(node, rng)
+        results[f"stage1_key[n={size}]"] = measure(match_key, [(k, node["options"]) for k in inputs["keys"]], budget)
+        results[f"stage2_substring[n={size}]"] = measure(match_substring, [(normalize(t), index) for t in inputs["texts"]], budget)
+        results[f"stage3_fuzzy[n={size}]"] = measure(match_fuzzy, [(t, index) for t in inputs["typos"]], budget)
+        results[f"stage4_keywords[n={size}]"] = measure(match_keywords, [(p, index) for p in inputs["phrases"]], budget)
+
+        turns = []
+        for _ in range(40):
+            turns += [rng.choice(["1", "2", "3"]), rng.choice(inputs["texts"]), rng.choice(inputs["typos"]), "menu"]
+        results[f"e2e[n={size}]"] = measure(converse, [(tree, turns)], budget, min_calls=1, rounds=1 if size >= 1000 else 3)
+    return results
+
+
+def compare(results, baseline, threshold, noise_us=0.5):
+    """Return a list of regression messages against the baseline (ignoring sub-noise_us changes)."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if current["p50_us"] > base["p50_us"] * (1 + threshold) + noise_us:
+            regressions.append(f"{name}: p50 {current['p50_us']:.1f}us vs baseline {base['p50_us']:.1f}us")
+        if current["p50_us"] > base["p50_us"] + noise_us and current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['ops_per_sec']:.0f} ops/s vs baseline {base['ops_per_sec']:.0f} ops/s")
+        if current["peak_kib"] > base["peak_kib"] * (1 + threshold) + 1:
+            regressions.append(f"{name}: peak {current['peak_kib']:.0f} KiB vs baseline {base['peak_kib']:.0f} KiB")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'benchmark':<28} {'ops/s':>12} {'p50 us':>10} {'p99 us':>10} {'peak KiB':>10}")
+    for name, r in results.items():
+        print(f"{name:<28} {r['ops_per_sec']:>12.0f} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} {r['peak_kib']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot matcher and engine.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="options per node")
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds spent timing each benchmark")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed regression as a fraction")
+    parser.add_argument("--json", help="also write this run's results to a JSON file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.budget)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for message in regressions:
+            print("  " + message)
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
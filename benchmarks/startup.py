@@ -0,0 +1,101 @@
+"""
+Startup benchmark: time from launching `python Main.py` to its first input prompt.
+
+Each run starts a fresh interpreter, so the time covers interpreter startup, imports
+and loading the engine. Two cases are timed:
+- cold: scripts/menu.snapshot removed first, so the scripts are compiled and the
+  snapshot written
+- warm: the snapshot is current and loaded as is (the normal case)
+
+    python benchmarks/startup.py                      # 10 runs of each, 75 ms warm budget
+    python benchmarks/startup.py --runs 30 --budget-ms 100
+
+A run fails (exit status 1) when the warm median is over --budget-ms. Like the other
+benchmarks, budgets are machine specific. Without cached bytecode (__pycache__ can't
+be written, or PYTHONDONTWRITEBYTECODE is set) every run also compiles the modules it
+imports, which dwarfs everything else measured here.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "Main.py")
+SNAPSHOT = os.path.join(ROOT, "scripts", "menu.snapshot")
+PROMPT = b"Your choice"
+
+
+def time_to_prompt(python=sys.executable):
+    """Seconds until a new Main.py process has printed its first prompt."""
+    env = dict(os.environ, PYTHONIOENCODING="utf-8")
+    started = time.perf_counter()
+    proc = subprocess.Popen([python, MAIN], cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    try:
+        seen = b""
+        while PROMPT not in seen:
+            chunk = os.read(proc.stdout.fileno(), 1 << 16)
+            if not chunk:
+                raise RuntimeError(f"Main.py exited before its first prompt: {seen[-200:]!r}")
+            seen += chunk
+        return time.perf_counter() - started
+    finally:
+        proc.kill()
+        proc.wait()
+        proc.stdin.close()
+        proc.stdout.close()
+
+
+def remove_snapshot():
+    try:
+        os.remove(SNAPSHOT)
+    except FileNotFoundError:
+        pass
+
+
+def run_startup(runs, python=sys.executable):
+    """{"cold": [...], "warm": [...]}: time to first prompt in ms, one entry per run."""
+    results = {"cold": [], "warm": []}
+    for _ in range(runs):
+        remove_snapshot()
+        results["cold"].append(time_to_prompt(python) * 1000)
+    time_to_prompt(python)  # leave a current snapshot behind
+    for _ in range(runs):
+        results["warm"].append(time_to_prompt(python) * 1000)
+    return results
+
+
+def summarize(times):
+    return {"min_ms": min(times), "median_ms": statistics.median(times), "max_ms": max(times)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot's time to first prompt.")
+    parser.add_argument("--runs", type=int, default=10, help="processes started per case")
+    parser.add_argument("--budget-ms", type=float, default=75.0, help="allowed warm median time to first prompt")
+    parser.add_argument("--python", default=sys.executable, help="interpreter to start Main.py with")
+    parser.add_argument("--json", help="also write this run's results to a JSON file")
+    args = parser.parse_args(argv)
+
+    results = {case: summarize(times) for case, times in run_startup(args.runs, args.python).items()}
+    print(f"{'startup':<10} {'min ms':>10} {'median ms':>10} {'max ms':>10}")
+    for case, r in results.items():
+        print(f"{case:<10} {r['min_ms']:>10.1f} {r['median_ms']:>10.1f} {r['max_ms']:>10.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    warm = results["warm"]["median_ms"]
+    if warm > args.budget_ms:
+        print(f"\nWarm startup {warm:.1f} ms is over the {args.budget_ms:.0f} ms budget.")
+        return 1
+    print(f"\nWarm startup {warm:.1f} ms is within the {args.budget_ms:.0f} ms budget.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+Multi-process launcher: the parent loads the dialogue tree and builds every node's
+match index once, then forks worker processes that share all of it copy-on-write.
+
+Before forking, the parent loads the whole tree with its indexes attached (from the
+engine snapshot, see Main.load_engine) and moves every object it holds into
+gc.freeze()'s permanent generation. The workers' garbage collector never writes to
+those pages, so they stay shared. A worker's private memory is therefore its
+sessions, not its copy of the scripts, and it stays flat as characters are added.
+memory_usage() shows the split for a pid.
+
+The parent then acts as the router. It accepts clients on the public port and gives
+each connection a session id. It forwards the connection to the worker that owns
+that id on a consistent-hash ring (HashRing), so a session always lands on the same
+worker. Changing the worker count only moves about 1/N of the sessions. A client
+resumes a session by sending "SESSION <id>" as soon as it connects: the router waits
+up to resume_wait for that line before opening a new session, so a resume goes
+straight to the id's worker. (A SESSION line sent later, after the greeting, is
+still honoured, at the cost of the new session opened meanwhile.) Workers run
+server.ChatServer in routed mode on loopback ports.
+
+With --history-dir each worker logs to its own worker-N/ directory. At startup a
+worker replays every worker-*/ directory there and keeps the unfinished sessions the
+ring now assigns to it, so sessions stay resumable when the worker count changes.
+
+Needs os.fork, so Linux/Unix only. Everything runs on one box:
+    python cluster.py --workers 4 --port 8765 --history-dir history/
+    python loadgen.py --port 8765 --clients 1000
+"""
+import argparse
+import asyncio
+import bisect
+import gc
+import hashlib
+import os
+import signal
+import socket
+import sys
+import traceback
+import uuid
+
+import history
+import snapshot
+from Main import chatbot, compile_tree, enable_semantic_stage
+from server import ROUTE_PREFIX, SESSION_PREFIX, ChatServer
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of session ids onto workers, with replicas points per worker."""
+
+    def __init__(self, workers, replicas=64):
+        points = sorted((ring_hash(f"{worker}#{i}"), worker) for worker in workers for i in range(replicas))
+        self.hashes = [h for h, _ in points]
+        self.workers = [worker for _, worker in points]
+
+    def lookup(self, key):
+        """The worker owning key: the first ring point at or after its hash, wrapping around."""
+        i = bisect.bisect_left(self.hashes, ring_hash(key))
+        return self.workers[i % len(self.workers)]
+
+
+def memory_usage(pid):
+    """{"rss", "pss", "shared", "private"} in kB for a process, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if rest.strip().endswith("kB"):
+                fields[name] = int(rest.split()[0])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def preload(root):
+    """
+    Unpickle every conversation the snapshot left for later (see
+    snapshot.LazySection), so the workers share them, and keep the GC off the pages
+    of the compiled tree from now on.
+    """
+    snapshot.load_sections(root)
+    gc.collect()
+    gc.freeze()
+    return root
+
+
+async def serve_worker(sock, log, saved=None, new_session_id=None):
+    server = ChatServer(log=log, routed=True, saved=saved, new_session_id=new_session_id)
+    listener = await asyncio.start_server(server.handle, sock=sock, limit=server.max_line)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    async with listener:
+        await stop.wait()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        # Already stopping; a second signal (Ctrl-C reaches the whole group) changes nothing
+        loop.remove_signal_handler(signum)
+        signal.signal(signum, signal.SIG_IGN)
+
+
+def worker_log_dirs(history_dir):
+    """Every worker-N/ log directory under history_dir, including ones from a larger cluster."""
+    try:
+        names = os.listdir(history_dir)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(history_dir, name) for name in sorted(names)
+            if name.startswith("worker-") and os.path.isdir(os.path.join(history_dir, name))]
+
+
+def owned_sessions(history_dir, ring, worker):
+    """The unfinished sessions, from every worker's log, that the ring assigns to worker."""
+    dirs = worker_log_dirs(history_dir)
+    if not dirs:
+        return {}
+    return {session_id: saved for session_id, saved in history.load_sessions(*dirs).items()
+            if ring.lookup(session_id) == worker}
+
+
+def owned_session_id(ring, worker):
+    """A fresh session id that the ring assigns to worker, so the client's resumes come back to it."""
+    while True:
+        session_id = uuid.uuid4().hex
+        if ring.lookup(session_id) == worker:
+            return session_id
+
+
+def run_worker(sock, history_dir, ring, worker):
+    log = saved = None
+    if history_dir:
+        saved = owned_sessions(history_dir, ring, worker)  # before our own log adds a segment
+        log = history.HistoryLog(os.path.join(history_dir, f"worker-{worker}"))
+    try:
+        asyncio.run(serve_worker(sock, log, saved, lambda: owned_session_id(ring, worker)))
+    finally:
+        if log is not None:
+            log.close()
+
+
+class Router:
+    """Front end in the parent: pipes each client to the worker its session id hashes to."""
+
+    def __init__(self, ring, addresses, max_line=64 * 1024, resume_wait=0.05):
+        self.ring = ring
+        self.addresses = addresses  # worker -> (host, port)
+        self.max_line = max_line
+        self.resume_wait = resume_wait  # seconds to wait for a "SESSION <id>" line before starting a new session
+
+    async def connect(self, session_id, action):
+        host, port = self.addresses[self.ring.lookup(session_id)]
+        reader, writer = await asyncio.open_connection(host, port, limit=self.max_line)
+        writer.write(f"{ROUTE_PREFIX}{session_id} {action}\n".encode("utf-8"))
+        return reader, writer
+
+    async def open_upstream(self, session_id, action, writer):
+        """Connect to session_id's worker and start copying its output to writer; returns (upstream writer, task)."""
+        up_reader, up_writer = await self.connect(session_id, action)
+        return up_writer, asyncio.create_task(self.pipe(up_reader, writer))
+
+    @staticmethod
+    async def pipe(reader, writer):
+        """Copy bytes until reader reaches EOF, then close writer."""
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def handle(self, reader, writer):
+        first_line = asyncio.ensure_future(reader.readline())
+        up_writer = downstream = None
+        try:
+            # A resuming client sends its SESSION line right away; anyone else waits for the greeting
+            done, _ = await asyncio.wait({first_line}, timeout=self.resume_wait)
+            if not done:
+                up_writer, downstream = await self.open_upstream(uuid.uuid4().hex, "new", writer)
+            first = await first_line
+            if first.startswith(SESSION_PREFIX.encode("utf-8")):
+                if downstream is not None:
+                    # Sent after the greeting: drop the fresh session and go to the worker that owns this id
+                    downstream.cancel()
+                    up_writer.close()
+                session_id = first[len(SESSION_PREFIX):].decode("utf-8", errors="replace").strip()
+                up_writer, downstream = await self.open_upstream(session_id, "resume", writer)
+            elif first:
+                if downstream is None:
+                    up_writer, downstream = await self.open_upstream(uuid.uuid4().hex, "new", writer)
+                up_writer.write(first)
+            if first:
+                await self.pipe(reader, up_writer)
+            elif up_writer is not None:
+                up_writer.close()
+            if downstream is not None:
+                await downstream
+        except ConnectionError:
+            pass
+        finally:
+            first_line.cancel()
+            if downstream is not None:
+                downstream.cancel()
+                up_writer.close()
+            writer.close()
+
+
+async def route(host, port, router):
+    server = await asyncio.start_server(router.handle, host, port, limit=router.max_line)
+    addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+    print(f"Routing chats on {addresses} to {len(router.addresses)} workers")
+    async with server:
+        await server.serve_forever()
+
+
+def start_workers(count, history_dir=None, ring=None):
+    """
+    Fork count workers on loopback ports; returns ({worker: (host, port)}, [pid, ...]).
+    With history_dir, ring is the router's HashRing, which decides the sessions each worker resumes.
+    """
+    ring = ring if ring is not None else HashRing(range(count))
+    sockets = []
+    for _ in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(1024)
+        sockets.append(sock)
+    addresses, pids = {}, []
+    for worker, sock in enumerate(sockets):
+        addresses[worker] = sock.getsockname()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                for other in sockets:
+                    if other is not sock:
+                        other.close()
+                run_worker(sock, history_dir, ring, worker)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        pids.append(pid)
+    for sock in sockets:
+        sock.close()  # the workers hold their own copies
+    return addresses, pids
+
+
+def stop_workers(pids):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # a second Ctrl-C must not orphan the workers
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve chatbot conversations from several forked workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--replicas", type=int, default=64, help="points per worker on the hash ring")
+    parser.add_argument("--history-dir", help="log turns under worker-N/ here and allow resuming sessions")
+    parser.add_argument("--semantic", action="store_true", help="match paraphrases by n-gram embedding as a last resort")
+    args = parser.parse_args(argv)
+
+    if args.semantic:
+        enable_semantic_stage()
+        compile_tree(chatbot)  # the snapshot has no embeddings; build them before forking so they are shared
+    preload(chatbot)
+    ring = HashRing(range(args.workers), args.replicas)
+    addresses, pids = start_workers(args.workers, args.history_dir, ring)
+    for worker, pid in enumerate(pids):
+        print(f"Worker {worker}: pid {pid} on {addresses[worker][0]}:{addresses[worker][1]}", file=sys.stderr)
+    router = Router(ring, addresses)
+    try:
+        asyncio.run(route(args.host, args.port, router))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_workers(pids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Dialogue scripts: the JSON authoring files behind the conversation tree.
+
+Authoring layout: a menu file whose "options" map each key to a character file,
+e.g. {"prompt": "...", "options": {"1": "kalam.json"}}. Each character file holds the
+option for that character: {"text": ..., "speaker": ..., "color": ..., "response": ...,
+"followup": {...}}. The character's speaker label and ANSI color apply to its whole
+subtree unless an option sets its own; an option may also set its menu "emoji".
+
+Main.load_engine compiles the loaded tree and caches it as a snapshot (see
+snapshot.py), which keeps each followup menu on disk until someone navigates into it.
+"""
+import os
+
+# Who speaks when no character does (e.g. "Return to main menu", which has no response)
+NARRATOR = "💬 Chatbot"
+NARRATOR_COLOR = "31"
+DEFAULT_EMOJI = "👉"
+
+
+def guess_emoji(option_text):
+    """Pick a menu emoji from the option text, for options that don't set one."""
+    text = option_text.lower()
+    if "dumpling" in text: return "🥟"
+    elif "return" in text: return "🔙"
+    elif "motivation" in text: return "💡"
+    elif "kung fu" in text: return "🥋"
+    elif "talk" in text: return "🗣️"
+    return DEFAULT_EMOJI
+
+
+def resolve_metadata(tree):
+    """
+    Settle every option's presentation once, at load time, so rendering a turn is
+    just field lookups:
+    - "speaker"/"color": who says the response, inherited from the nearest option
+      above that sets them (normally the character's root); the narrator for options
+      without a response
+    - "emoji": shown next to the option in the menu
+    - "goto": "main_menu" for "Return to main menu" options
+    """
+    stack = [(tree, NARRATOR, NARRATOR_COLOR)]
+    while stack:
+        node, speaker, color = stack.pop()
+        for option in node["options"].values():
+            own_speaker = option.get("speaker", speaker)
+            own_color = option.get("color", color)
+            if "response" in option or "speaker" in option:
+                option["speaker"], option["color"] = own_speaker, own_color
+            else:
+                option["speaker"], option["color"] = NARRATOR, NARRATOR_COLOR
+            option.setdefault("emoji", guess_emoji(option["text"]))
+            if "followup" in option:
+                stack.append((option["followup"], own_speaker, own_color))
+            elif option["text"].lower() == "return to main menu":
+                option["goto"] = "main_menu"
+            elif "options" in option:
+                stack.append((option, own_speaker, own_color))
+    return tree
+
+
+def load_json_tree(menu_path):
+    """Build the plain nested-dict tree from a menu file and its character files."""
+    import json  # not needed to start from an engine snapshot
+    with open(menu_path, encoding="utf-8") as f:
+        menu = json.load(f)
+    base = os.path.dirname(os.path.abspath(menu_path))
+    options = {}
+    for key, filename in menu["options"].items():
+        with open(os.path.join(base, filename), encoding="utf-8") as f:
+            options[key] = json.load(f)
+    return resolve_metadata({"prompt": menu["prompt"], "options": options})
+
+
+def script_sources(menu_path):
+    """The menu file followed by every character file it references."""
+    import json
+    with open(menu_path, encoding="utf-8") as f:
+        menu = json.load(f)
+    base = os.path.dirname(os.path.abspath(menu_path))
+    return [menu_path] + [os.path.join(base, name) for name in menu["options"].values()]
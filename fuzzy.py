@@ -0,0 +1,141 @@
+"""
+Fuzzy matching backends for the typo stage of match_option.
+
+difflib (and the re module it pulls in) is imported on the first fuzzy lookup
+rather than at startup: most turns are settled by an earlier stage.
+"""
+import math
+from bisect import bisect_left, bisect_right
+
+
+def bigrams(text):
+    """Count the character bigrams of a string."""
+    counts = {}
+    for i in range(len(text) - 1):
+        gram = text[i:i + 2]
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+class DifflibMatcher:
+    """The original linear scan: difflib.get_close_matches over every option text."""
+
+    name = "difflib"
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+
+    def best(self, word, cutoff=0.8):
+        """Return the closest text scoring at least cutoff, or None."""
+        from difflib import get_close_matches
+        close = get_close_matches(word, self.texts, n=1, cutoff=cutoff)
+        return close[0] if close else None
+
+
+class NgramMatcher:
+    """
+    Bigram index that prunes candidates before scoring them with difflib.
+
+    Two filters run before any SequenceMatcher is built:
+    - length: a ratio of at least cutoff needs 2 * min(len) / (len_a + len_b) >= cutoff,
+      so only texts in a length window (found by bisection) are considered
+    - bigram count: a ratio of at least cutoff means at least cutoff * (len_a + len_b) / 2
+      matched characters, which bounds the insert/delete distance d; strings within d
+      still share max(len) - 1 - (3d + |len_a - len_b|) / 2 bigrams
+    Both bounds are safe, and survivors are scored exactly like get_close_matches,
+    so the winner is always the same as DifflibMatcher's.
+    """
+
+    name = "ngram"
+
+    def __init__(self, texts):
+        # Texts sorted by length, so the length window is one contiguous slice
+        self.texts = sorted(texts, key=len)
+        self.lengths = [len(text) for text in self.texts]
+        # bigram -> ([positions in self.texts, ascending], [counts])
+        self.postings = {}
+        for i, text in enumerate(self.texts):
+            for gram, count in bigrams(text).items():
+                positions, counts = self.postings.setdefault(gram, ([], []))
+                positions.append(i)
+                counts.append(count)
+
+    def candidates(self, word, cutoff=0.8):
+        """Yield texts that could still score at least cutoff against word."""
+        la = len(word)
+        if cutoff <= 0:
+            lo, hi = 0, len(self.lengths)
+        else:
+            lo = bisect_left(self.lengths, la * cutoff / (2 - cutoff) - 1)
+            hi = bisect_right(self.lengths, la * (2 - cutoff) / cutoff + 1)
+
+        # Shared bigrams (as multisets) with every text inside the window
+        common = {}
+        for gram, count in bigrams(word).items():
+            posting = self.postings.get(gram)
+            if posting is None:
+                continue
+            positions, counts = posting
+            start, stop = bisect_left(positions, lo), bisect_left(positions, hi)
+            if count == 1:
+                for i in positions[start:stop]:
+                    common[i] = common.get(i, 0) + 1
+            else:
+                for j in range(start, stop):
+                    shared = counts[j] if counts[j] < count else count
+                    common[positions[j]] = common.get(positions[j], 0) + shared
+
+        needed = {}
+        for i in range(lo, hi):
+            lb = self.lengths[i]
+            if lb not in needed:
+                total = la + lb
+                # Fewest matched characters that can still reach cutoff (epsilon keeps it safe)
+                min_matches = max(0, math.ceil(cutoff * total / 2 - 1e-9))
+                max_indels = total - 2 * min_matches
+                # Each deletion breaks at most two bigrams of the longer text, each insertion one
+                needed[lb] = max(la, lb) - 1 - (3 * max_indels + abs(la - lb)) / 2
+            if common.get(i, 0) >= needed[lb]:
+                yield self.texts[i]
+
+    def best(self, word, cutoff=0.8):
+        """Return the closest text scoring at least cutoff, or None."""
+        from difflib import SequenceMatcher
+        s = SequenceMatcher()
+        s.set_seq2(word)
+        best = None
+        for text in self.candidates(word, cutoff):
+            s.set_seq1(text)
+            if s.real_quick_ratio() >= cutoff and s.quick_ratio() >= cutoff and s.ratio() >= cutoff:
+                scored = (s.ratio(), text)
+                # Same tie-break as get_close_matches: highest ratio, then largest text
+                if best is None or scored > best:
+                    best = scored
+        return best[1] if best else None
+
+
+FUZZY_BACKENDS = {
+    DifflibMatcher.name: DifflibMatcher,
+    NgramMatcher.name: NgramMatcher,
+}
+DEFAULT_BACKEND = NgramMatcher.name
+
+
+def make_matcher(texts, backend=None):
+    """Build a fuzzy matcher over texts using the named backend (default: DEFAULT_BACKEND)."""
+    try:
+        return FUZZY_BACKENDS[backend or DEFAULT_BACKEND](texts)
+    except KeyError:
+        raise ValueError(f"Unknown fuzzy backend: {backend!r}") from None
+
+
+def compare_backends(texts, words, backend=None, cutoff=0.8):
+    """Return (word, difflib result, backend result) for every word where the two disagree."""
+    reference = DifflibMatcher(texts)
+    other = make_matcher(texts, backend)
+    mismatches = []
+    for word in words:
+        expected, got = reference.best(word, cutoff), other.best(word, cutoff)
+        if expected != got:
+            mismatches.append((word, expected, got))
+    return mismatches
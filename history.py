@@ -0,0 +1,250 @@
+"""
+Chat history: an append-only binary log of every turn, from which sessions resume.
+
+A session is stored as little more than its path of option keys, never as copies of
+the tree. Each turn becomes one record:
+    u32 payload length, u32 CRC-32 of the payload, then the payload:
+    f64 timestamp, u8 ended flag, u8 state length, u16 session id length,
+    u16 path length, u32 input length, then the state name, session id,
+    path (keys joined by PATH_SEP) and user input (all UTF-8)
+Records go to numbered segment files (00000001.log, ...). A new segment starts when
+the current one passes segment_bytes, and every run starts a fresh segment, so a
+torn tail from a crash is never appended to.
+
+HistoryLog.append() only queues the encoded record. A background thread writes
+queued records in batches and fsyncs at most every fsync_interval seconds, so turns
+never wait on the disk.
+
+When a write fails (a full disk, say) the writer reports it on stderr, cuts the
+segment back to what was last written whole, and retries the unwritten records at
+its next batch, so a torn frame never ends up in front of later records. While it
+can't write, at most max_pending records wait in memory; newer turns are dropped
+(and counted in `dropped`) with a warning instead of growing the queue without bound.
+"""
+import heapq
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque, namedtuple
+from operator import itemgetter
+
+FRAME = struct.Struct("<II")
+BODY = struct.Struct("<dBBHHI")
+PATH_SEP = "\x1f"
+
+SavedSession = namedtuple("SavedSession", "session_id path state turns last_seen")
+
+
+def encode_record(session_id, user_input, path, state, ended, timestamp):
+    name = state.encode("utf-8")
+    sid = session_id.encode("utf-8")
+    keys = PATH_SEP.join(path).encode("utf-8")
+    text = user_input.encode("utf-8")
+    header = BODY.pack(timestamp, 1 if ended else 0, len(name), len(sid), len(keys), len(text))
+    payload = header + name + sid + keys + text
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_records(data):
+    """Yield (session_id, user_input, path, state, ended, timestamp) until the data ends or is torn."""
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        start, end = offset + FRAME.size, offset + FRAME.size + length
+        if end > len(data) or length < BODY.size or zlib.crc32(data[start:end]) != crc:
+            return  # torn or corrupt tail
+        timestamp, ended, name_len, sid_len, path_len, text_len = BODY.unpack_from(data, start)
+        pos = start + BODY.size
+        state = data[pos:pos + name_len].decode("utf-8")
+        pos += name_len
+        session_id = data[pos:pos + sid_len].decode("utf-8")
+        pos += sid_len
+        keys = data[pos:pos + path_len].decode("utf-8")
+        pos += path_len
+        user_input = data[pos:pos + text_len].decode("utf-8")
+        path = tuple(keys.split(PATH_SEP)) if keys else ()
+        yield session_id, user_input, path, state, bool(ended), timestamp
+        offset = end
+
+
+def segment_paths(directory):
+    """Segment files in the order they were written."""
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".log"))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+
+def replay(directory):
+    """Every record in a log directory, in the order it was written."""
+    for path in segment_paths(directory):
+        with open(path, "rb") as f:
+            data = f.read()
+        yield from decode_records(data)
+
+
+def load_sessions(*directories):
+    """
+    Replay the log and return {session_id: SavedSession} for every unfinished session.
+    Given several directories (one per cluster worker), their records are replayed
+    together in timestamp order, so a session that moved between them ends up with
+    its latest state.
+    """
+    records = replay(directories[0]) if len(directories) == 1 else \
+        heapq.merge(*map(replay, directories), key=itemgetter(5))
+    sessions = {}
+    for session_id, _, keys, state, ended, timestamp in records:
+        if ended:
+            sessions.pop(session_id, None)
+            continue
+        previous = sessions.get(session_id)
+        turns = previous.turns + 1 if previous else 1
+        sessions[session_id] = SavedSession(session_id, keys, state, turns, timestamp)
+    return sessions
+
+
+def read_history(directory, session_id):
+    """Every (timestamp, user input, path, state) logged for one session, oldest first."""
+    return [(timestamp, user_input, keys, state)
+            for sid, user_input, keys, state, _, timestamp in replay(directory) if sid == session_id]
+
+
+class HistoryLog:
+    """Write-behind appender for the chat-history log."""
+
+    def __init__(self, directory, segment_bytes=64 << 20, fsync_interval=1.0, flush_interval=0.05,
+                 max_pending=100000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0  # records refused because the queue was full
+        self.error = None  # the last write error, until a write succeeds again
+        os.makedirs(directory, exist_ok=True)
+        existing = segment_paths(directory)
+        self._segment = int(os.path.basename(existing[-1])[:-4]) if existing else 0
+        self._file = None
+        self._size = 0
+        self._flushed = 0  # bytes of the current segment known to be written whole
+        self._open_segment()
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._last_sync = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, session_id, user_input, path, state, ended=False, timestamp=None):
+        """Queue one turn; returns immediately. ended marks the session's last turn."""
+        if len(self._pending) >= self.max_pending:
+            if not self.dropped:
+                print(f"Chat history queue is full ({self.max_pending} records), dropping turns", file=sys.stderr)
+            self.dropped += 1
+            return
+        self._pending.append(encode_record(session_id, user_input, path, state, ended,
+                                           time.time() if timestamp is None else timestamp))
+
+    def _open_segment(self):
+        self._segment += 1
+        path = os.path.join(self.directory, f"{self._segment:08d}.log")
+        self._file = open(path, "ab", buffering=1 << 16)
+        self._size = self._flushed = 0
+
+    def _close_segment(self):
+        file, self._file = self._file, None
+        try:
+            file.flush()
+            os.fsync(file.fileno())
+        finally:
+            file.close()
+
+    def _drain(self):
+        """Write every queued record; on an I/O error the ones not safely written go back to the queue."""
+        pending, batch = self._pending, []
+        while pending:
+            batch.append(pending.popleft())
+        kept = 0  # records of the batch already in a closed, synced segment
+        try:
+            if self._file is None:
+                self._open_segment()
+            for i, record in enumerate(batch):
+                if self._size >= self.segment_bytes:
+                    self._close_segment()
+                    kept = i
+                    self._open_segment()
+                self._file.write(record)
+                self._size += len(record)
+            self._file.flush()
+        except OSError:
+            pending.extendleft(reversed(batch[kept:]))
+            raise
+        self._flushed = self._size
+        return bool(batch)
+
+    def _recover(self, error):
+        """Report a failed write and cut the segment back to its last whole record."""
+        if self.error is None:
+            print(f"Chat history write failed, retrying: {error}", file=sys.stderr)
+        self.error = error
+        file, self._file = self._file, None
+        if file is None:
+            return
+        try:
+            file.close()
+        except OSError:
+            pass  # the buffered tail is cut off below anyway
+        try:
+            os.truncate(file.name, self._flushed)
+            self._file = open(file.name, "ab", buffering=1 << 16)
+            self._size = self._flushed
+        except OSError:
+            pass  # the next batch starts a new segment
+
+    def _resumed(self):
+        if self.error is not None:
+            print(f"Chat history writes resumed ({self.dropped} turns dropped)", file=sys.stderr)
+            self.error = None
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def _run(self):
+        dirty = False
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                if self._drain():
+                    # Handed to the OS: a process crash now loses at most flush_interval
+                    dirty = True
+                self._resumed()
+                if self._stopping:
+                    break
+                if dirty and time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+                    dirty = False
+            except OSError as e:
+                self._recover(e)
+                if self._stopping:
+                    break
+
+    def close(self):
+        """Write and fsync everything still queued, then close the segment."""
+        self._stopping = True
+        self._wake.set()
+        self._thread.join()
+        try:
+            self._drain()
+            self._resumed()
+            self._close_segment()
+        except OSError as e:
+            self._recover(e)
+            print(f"Chat history closed with {len(self._pending)} turns unwritten: {e}", file=sys.stderr)
+            if self._file is not None:
+                self._file.close()
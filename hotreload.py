@@ -0,0 +1,140 @@
+"""
+Hot reload of the dialogue scripts while conversations keep running.
+
+TreeVersions watches the script sources (see dialogue.script_sources) from a daemon
+thread. When one changes it rebuilds the tree in that thread and then swaps
+`current` to the new root in a single assignment, so matching never waits on a
+reload.
+
+Versions are structurally shared: every subtree is identified by a digest of its
+content, and a subtree whose digest already exists in the current version is
+replaced by the existing node, together with the OptionIndex already built for it.
+A reload therefore only allocates, indexes and renders the nodes that actually
+changed. Match cache entries stay valid too, since they are keyed on index uid.
+
+A session holds the root it started from, so by default it stays pinned to that
+version until it ends and the old nodes are freed with it. Call
+ConversationSession.migrate(versions.current) to move it to the new version by
+its path of option keys instead.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections.abc import Mapping
+
+from dialogue import load_json_tree, script_sources
+from Main import compile_tree
+
+
+def share_subtrees(tree, previous):
+    """
+    Replace every dict in tree whose content equals a node of the previous version
+    (a digest -> node table) with that node. Returns (root, table) where table maps
+    digest -> node for every node of the result.
+    """
+    digests = {}  # id(node) -> digest, for the nodes walked so far
+    table = {}
+    stack = [(tree, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((value, False) for value in node.values() if isinstance(value, Mapping))
+            continue
+        h = hashlib.blake2b(digest_size=16)
+        for key in sorted(node):
+            if key.startswith("_"):
+                continue  # derived data such as "_index"
+            value = node[key]
+            h.update(key.encode("utf-8") + b"\x00")
+            if isinstance(value, Mapping):  # a dict, or a snapshot.LazySection
+                digest = digests[id(value)]
+                canonical = previous.get(digest, table.get(digest, value))
+                node[key] = table[digest] = canonical
+                h.update(b"\x01" + digest)
+            else:
+                h.update(b"\x02" + json.dumps(value, ensure_ascii=False).encode("utf-8") + b"\x00")
+        digests[id(node)] = h.digest()
+    digest = digests[id(tree)]
+    root = previous.get(digest, tree)
+    table[digest] = root
+    return root, table
+
+
+class TreeVersions:
+    """
+    The live version of the conversation tree for a menu file, kept up to date with
+    the files on disk. Read `current` for the newest root; `version` counts swaps.
+    Pass the tree already loaded from the same files as root (e.g. Main.chatbot) to
+    start from it instead of compiling a second copy: a lazily loaded one stays lazy
+    until the first reload, which walks it to find the subtrees it can share.
+    """
+
+    def __init__(self, menu_path, interval=1.0, fuzzy_backend=None, keyword_weighting="count", root=None):
+        self.menu_path = menu_path
+        self.interval = interval
+        self.fuzzy_backend = fuzzy_backend
+        self.keyword_weighting = keyword_weighting
+        self.version = 0
+        self.built = 0  # menu nodes compiled by the last reload
+        self._table = {}
+        self._stamp = self._sources_stamp()
+        if root is None:
+            self.current = self._build()
+        else:
+            self.current = root
+            self._table = None  # digested at the first reload
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sources_stamp(self):
+        stamp = []
+        for path in script_sources(self.menu_path):
+            st = os.stat(path)
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+        return stamp
+
+    def _build(self):
+        """Load the scripts, share unchanged subtrees with the current version and compile the new nodes."""
+        if self._table is None:
+            _, self._table = share_subtrees(self.current, {})
+        root, table = share_subtrees(load_json_tree(self.menu_path), self._table)
+        shared = set(map(id, self._table.values()))
+        compile_tree(root, self.fuzzy_backend, self.keyword_weighting, skip=shared)
+        self._table = table
+        self.built = sum(1 for node in table.values() if "options" in node and id(node) not in shared)
+        return root
+
+    def reload(self, force=False):
+        """Rebuild if a source file changed (or force); returns True when a new version was swapped in."""
+        stamp = self._sources_stamp()
+        if stamp == self._stamp and not force:
+            return False
+        self._stamp = stamp  # a broken file is retried on its next save, not every interval
+        root = self._build()
+        if root is self.current:
+            return False
+        self.current = root
+        self.version += 1
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.reload():
+                    print(f"Reloaded scripts: version {self.version}, {self.built} nodes rebuilt", file=sys.stderr)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Most likely a file caught mid-save; keep serving the current version
+                print(f"Script reload failed, keeping version {self.version}: {e}", file=sys.stderr)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="script-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
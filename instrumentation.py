@@ -0,0 +1,182 @@
+"""
+Opt-in matcher instrumentation: per-stage timings and hit counts, no-match counts and
+per-node traversal counts, with JSON and Prometheus text exporters.
+
+Enable it with Main.enable_instrumentation(); while it is off, match_option pays a
+single `is None` check.
+"""
+import json
+import math
+import os
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 5e-2, 0.1, math.inf)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, in the shape Prometheus expects."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+
+    def snapshot(self):
+        cumulative, running = [], 0
+        for count in self.counts:
+            running += count
+            cumulative.append(running)
+        return {"buckets": [["+Inf" if b == math.inf else b, c] for b, c in zip(BUCKETS, cumulative)],
+                "sum": self.total, "count": self.count}
+
+
+class MatchStats:
+    """In-process sink. match_option and ConversationSession call the record_* methods."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stage_time = {}
+            self.stage_hits = {}
+            self.match_time = Histogram()
+            self.no_match = 0
+            self.node_visits = {}
+            self.started = time.time()
+
+    def record_stage(self, stage, seconds, hit):
+        """One stage ran for seconds; hit is True if it answered (for "cache": found an entry)."""
+        with self._lock:
+            hist = self.stage_time.get(stage)
+            if hist is None:
+                hist = self.stage_time[stage] = Histogram()
+                self.stage_hits[stage] = 0
+            hist.observe(seconds)
+            if hit:
+                self.stage_hits[stage] += 1
+
+    def record_match(self, stage, seconds):
+        """A whole match_option call finished; stage is the one that resolved it, or None."""
+        with self._lock:
+            self.match_time.observe(seconds)
+            if stage is None:
+                self.no_match += 1
+
+    def record_visit(self, node_path):
+        """A session arrived at the node reached by node_path (a tuple of option keys)."""
+        label = "/".join(node_path) or "/"
+        with self._lock:
+            self.node_visits[label] = self.node_visits.get(label, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "since": self.started,
+                "stage_seconds": {stage: hist.snapshot() for stage, hist in self.stage_time.items()},
+                "stage_hits": dict(self.stage_hits),
+                "match_seconds": self.match_time.snapshot(),
+                "no_match": self.no_match,
+                "node_visits": dict(self.node_visits),
+            }
+
+
+def to_prometheus(snapshot, prefix="chatbot"):
+    """Render a MatchStats snapshot in the Prometheus text exposition format."""
+    lines = []
+
+    def histogram(name, data, labels=""):
+        sep = "," if labels else ""
+        suffix = f"{{{labels}}}" if labels else ""
+        for bound, count in data["buckets"]:
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+        lines.append(f"{name}_sum{suffix} {data['sum']}")
+        lines.append(f"{name}_count{suffix} {data['count']}")
+
+    name = f"{prefix}_match_stage_seconds"
+    lines += [f"# HELP {name} Time spent in each match_option stage.", f"# TYPE {name} histogram"]
+    for stage, data in snapshot["stage_seconds"].items():
+        histogram(name, data, f'stage="{stage}"')
+
+    name = f"{prefix}_match_stage_hits_total"
+    lines += [f"# HELP {name} Inputs resolved by each match_option stage.", f"# TYPE {name} counter"]
+    for stage, hits in snapshot["stage_hits"].items():
+        lines.append(f'{name}{{stage="{stage}"}} {hits}')
+
+    name = f"{prefix}_match_seconds"
+    lines += [f"# HELP {name} Total match_option time.", f"# TYPE {name} histogram"]
+    histogram(name, snapshot["match_seconds"])
+
+    name = f"{prefix}_no_match_total"
+    lines += [f"# HELP {name} Inputs no stage could resolve.", f"# TYPE {name} counter",
+              f"{name} {snapshot['no_match']}"]
+
+    name = f"{prefix}_node_visits_total"
+    lines += [f"# HELP {name} Times sessions arrived at each node.", f"# TYPE {name} counter"]
+    for node, visits in sorted(snapshot["node_visits"].items()):
+        escaped = node.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'{name}{{node="{escaped}"}} {visits}')
+    return "\n".join(lines) + "\n"
+
+
+def to_json(snapshot):
+    return json.dumps(snapshot, indent=2, ensure_ascii=False) + "\n"
+
+
+class PeriodicExporter:
+    """
+    Writes a MatchStats snapshot to a file every interval seconds from a daemon thread.
+    Files are replaced atomically, so readers never see a partial dump.
+    """
+
+    def __init__(self, stats, path, interval=10.0, render=to_json):
+        self.stats = stats
+        self.path = path
+        self.interval = interval
+        self.render = render
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render(self.stats.snapshot()))
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stats-exporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread and write one final snapshot."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+
+
+def json_dumper(stats, path, interval=10.0):
+    return PeriodicExporter(stats, path, interval, to_json)
+
+
+def prometheus_exporter(stats, path, interval=10.0):
+    """Keep a Prometheus textfile-collector file up to date."""
+    return PeriodicExporter(stats, path, interval, to_prometheus)
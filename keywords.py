@@ -0,0 +1,143 @@
+"""Keyword-overlap scoring for the last stage of match_option, as a sparse term-incidence matrix."""
+import math
+
+from semantic import load_numpy
+
+
+class Vocabulary:
+    """Term -> column id, shared by every node so all matrices use the same columns."""
+
+    def __init__(self):
+        self.ids = {}
+
+    def add(self, term):
+        return self.ids.setdefault(term, len(self.ids))
+
+    def get(self, term):
+        return self.ids.get(term)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+VOCABULARY = Vocabulary()
+WEIGHTINGS = ("count", "tfidf")
+
+
+class KeywordMatrix:
+    """
+    One node's options x vocabulary incidence matrix, stored sparsely by column:
+    term id -> ascending option positions containing that keyword.
+
+    Scoring an utterance is the sparse product of this matrix with the utterance's
+    term vector: only the columns of words the user actually typed are touched.
+    - "count" weighting scores the number of shared keywords, as before
+    - "tfidf" weights each shared keyword by its smoothed inverse document frequency
+      across the node's options, so rare words count for more than common ones
+    Ties always go to the earliest option, like the original stable sort.
+
+    best_many() scores a batch of utterances as one sparse matrix product with NumPy
+    (imported on first use, as in semantic.py), and one utterance at a time without it.
+    """
+
+    # Cells of the batch x options score matrix computed at once by best_many
+    BATCH_CELLS = 1 << 20
+
+    def __init__(self, keyword_sets, weighting="count", vocabulary=VOCABULARY):
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"Unknown keyword weighting: {weighting!r}")
+        self.size = len(keyword_sets)
+        self.weighting = weighting
+        self.vocabulary = vocabulary
+        self.columns = {}
+        for pos, keywords in enumerate(keyword_sets):
+            for term in keywords:
+                self.columns.setdefault(vocabulary.add(term), []).append(pos)
+        if weighting == "tfidf":
+            self.weights = {t: math.log((1 + self.size) / (1 + len(rows))) + 1 for t, rows in self.columns.items()}
+        else:
+            self.weights = None
+        self._flat = None
+
+    def term_ids(self, words):
+        """The utterance's sparse term vector: ids of its words that appear in this node."""
+        ids = []
+        for word in words:
+            term_id = self.vocabulary.get(word)
+            if term_id in self.columns:
+                ids.append(term_id)
+        return ids
+
+    def scores(self, words):
+        """Option position -> score, for options sharing at least one keyword with words."""
+        scores = {}
+        weights = self.weights
+        for term_id in self.term_ids(words):
+            weight = weights[term_id] if weights else 1
+            for pos in self.columns[term_id]:
+                scores[pos] = scores.get(pos, 0) + weight
+        return scores
+
+    def best(self, words):
+        """Position of the highest-scoring option (earliest on ties), or None if nothing overlaps."""
+        scores = self.scores(words)
+        if not scores:
+            return None
+        top = max(scores.values())
+        return min(pos for pos, score in scores.items() if score == top)
+
+    def _postings(self, np):
+        """
+        The columns as flat NumPy arrays, built on first use: ({term id: (start, end)},
+        option positions, weights), each column a slice of the two arrays.
+        """
+        if self._flat is None:
+            ranges, rows, weights = {}, [], []
+            for term_id, positions in self.columns.items():
+                ranges[term_id] = (len(rows), len(rows) + len(positions))
+                rows += positions
+                weights += [self.weights[term_id] if self.weights else 1.0] * len(positions)
+            self._flat = (ranges, np.array(rows, np.int64), np.array(weights, np.float64))
+        return self._flat
+
+    def best_many(self, word_sets, use_numpy=None):
+        """
+        best() for a batch of utterances.
+        use_numpy: None uses NumPy when it is installed, False never does, True requires it.
+        """
+        np = load_numpy() if use_numpy is not False else None
+        if use_numpy and np is None:
+            raise ImportError("NumPy is not installed")
+        word_sets = list(word_sets)
+        if np is None or not self.size:
+            return [self.best(words) for words in word_sets]
+        step = max(1, self.BATCH_CELLS // self.size)
+        results = []
+        for i in range(0, len(word_sets), step):
+            results += self._best_batch(np, word_sets[i:i + step])
+        return results
+
+    def _best_batch(self, np, word_sets):
+        """
+        The batch x options product of the utterances' term vectors with this matrix:
+        every (utterance, posting) pair of the terms they share adds its weight to one
+        cell, all in one bincount; argmax then takes the earliest of equal scores.
+        """
+        ranges, rows, weights = self._postings(np)
+        queries, starts, ends = [], [], []
+        for query, words in enumerate(word_sets):
+            for term_id in self.term_ids(words):
+                start, end = ranges[term_id]
+                queries.append(query)
+                starts.append(start)
+                ends.append(end)
+        starts, ends = np.array(starts, np.int64), np.array(ends, np.int64)
+        lengths = ends - starts
+        # Index of every posting of every (utterance, term) pair, in order
+        firsts = np.cumsum(lengths) - lengths
+        postings = np.repeat(starts - firsts, lengths) + np.arange(int(lengths.sum()))
+        cells = np.repeat(np.array(queries, np.int64), lengths) * self.size + rows[postings]
+        scores = np.bincount(cells, weights[postings], len(word_sets) * self.size).reshape(len(word_sets), self.size)
+        best = scores.argmax(axis=1)
+        top = scores[np.arange(len(word_sets)), best]
+        return [pos if score > 0 else None for pos, score in zip(best.tolist(), top.tolist())]
@@ -0,0 +1,94 @@
+"""
+Load generator for server.py: many concurrent scripted chats against one server.
+
+Each client connects, waits for the prompt, and sends `turns` inputs drawn at random
+from INPUTS. It then says 'exit' and records how long each turn took to answer.
+
+Usage: python loadgen.py --clients 1000 --turns 50 --port 8765
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from server import PROMPT_PREFIX
+
+INPUTS = ["1", "2", "3", "4", "menu", "return to main menu", "dumplings", "kung fu",
+          "how do you handle fear", "tell me about being spider man", "motivashun", "restart"]
+
+
+async def read_turn(reader):
+    """Read lines up to and including the next prompt line. Returns False on EOF."""
+    while True:
+        line = await reader.readline()
+        if not line:
+            return False
+        if line.startswith(PROMPT_PREFIX.encode("utf-8")):
+            return True
+
+
+async def run_client(host, port, turns, rng, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        if not await read_turn(reader):
+            return False
+        for _ in range(turns):
+            started = time.perf_counter()
+            writer.write((rng.choice(INPUTS) + "\n").encode("utf-8"))
+            await writer.drain()
+            if not await read_turn(reader):
+                return False
+            latencies.append(time.perf_counter() - started)
+        writer.write(b"exit\n")
+        await writer.drain()
+        await reader.read()
+        return True
+    finally:
+        writer.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def run_load(host, port, clients, turns, seed=0):
+    """Run all clients concurrently and return a summary dict."""
+    latencies = []
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_client(host, port, turns, random.Random(seed + i), latencies) for i in range(clients)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "clients": clients,
+        "completed": sum(1 for r in results if r is True),
+        "failed": sum(1 for r in results if r is not True),
+        "turns": len(latencies),
+        "seconds": elapsed,
+        "turns_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive concurrent scripted chats against server.py.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    summary = asyncio.run(run_load(args.host, args.port, args.clients, args.turns, args.seed))
+    print(f"{summary['completed']}/{summary['clients']} clients finished, {summary['failed']} failed")
+    print(f"{summary['turns']} turns in {summary['seconds']:.2f}s "
+          f"({summary['turns_per_second']:.0f} turns/s), "
+          f"p50 {summary['p50_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
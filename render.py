@@ -0,0 +1,93 @@
+"""
+Output layer: where a conversation's lines go, kept apart from the engine.
+
+ConversationSession only returns lines. A Renderer collects them and writes them in
+batches, on flush() or once batch_lines are pending, so a turn costs one write
+instead of one per line. batch_lines=1 streams every line as soon as it is emitted.
+A renderer's `color` says whether it wants the ANSI-colored replies; sessions pick
+the matching pre-rendered reply string (see Main.render_reply), so nothing is
+re-colored per turn.
+
+- TextRenderer: any text stream. color=True for an ANSI terminal, False for plain
+  text, and io.StringIO() for headless runs and load tests.
+- AsyncRenderer: an asyncio StreamWriter with bounded buffering. drain() waits for
+  the client only while its unsent output is above high_water, and gives up with
+  SlowClientError after drain_timeout. A client that stops reading therefore only
+  holds up its own session, for a bounded time and memory, and never the event
+  loop that matches everyone else's input.
+"""
+import sys
+from abc import ABC, abstractmethod
+
+
+class SlowClientError(ConnectionError):
+    """The client stopped reading its output; its connection should be dropped."""
+
+
+class Renderer(ABC):
+    """Batches lines and hands them to write() as one block of text; subclasses say where it goes."""
+
+    color = False
+
+    def __init__(self, batch_lines=64):
+        self.batch_lines = batch_lines
+        self.pending = []
+
+    def emit(self, lines):
+        self.pending.extend(lines)
+        if len(self.pending) >= self.batch_lines:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.write("\n".join(self.pending) + "\n")
+            self.pending.clear()
+
+    @abstractmethod
+    def write(self, text):
+        """Send one block of text (whole lines, newline-terminated) to the output."""
+
+
+class TextRenderer(Renderer):
+    """Renders to a text stream such as sys.stdout."""
+
+    def __init__(self, stream=None, color=False, batch_lines=64):
+        super().__init__(batch_lines)
+        self.stream = sys.stdout if stream is None else stream
+        self.color = color
+
+    def write(self, text):
+        self.stream.write(text)
+        self.stream.flush()
+
+
+def terminal_renderer(stream=None):
+    """ANSI-colored output for an interactive terminal."""
+    return TextRenderer(stream, color=True)
+
+
+class AsyncRenderer(Renderer):
+    """Renders to an asyncio StreamWriter; call drain() after flush() to apply backpressure."""
+
+    def __init__(self, writer, color=False, batch_lines=64, high_water=64 * 1024, drain_timeout=30.0):
+        super().__init__(batch_lines)
+        self.writer = writer
+        self.color = color
+        self.high_water = high_water
+        self.drain_timeout = drain_timeout
+
+    def write(self, text):
+        self.writer.write(text.encode("utf-8"))
+
+    async def drain(self):
+        """Wait until the client has taken the output down to high_water; SlowClientError after drain_timeout."""
+        transport = self.writer.transport
+        if transport.is_closing():
+            raise ConnectionResetError("client went away")
+        if transport.get_write_buffer_size() <= self.high_water:
+            return
+        import asyncio  # only servers get here; terminal sessions never pay for importing it
+        try:
+            await asyncio.wait_for(self.writer.drain(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            raise SlowClientError(f"client read nothing for {self.drain_timeout}s") from None
@@ -0,0 +1,262 @@
+"""
+Optional semantic stage of match_option: catches inputs that share no exact words
+or near-spellings with any option's text but are close to an option in wording or
+topic ("motivate me" for "Motivation during challenges", "how did you deal with
+failing?" for an option that leads to "Hear how I overcame failure"). Main embeds
+each option's text together with its response and the options it leads to.
+
+Texts are embedded as hashed character n-gram vectors: every 3- and 4-gram of each
+content word (STOPWORDS are skipped), padded with spaces, is hashed into one of DIM
+buckets. Each bucket is weighted by its log-scaled count times its inverse document
+frequency across the node's options, and each vector is L2-normalized and quantized
+to SCALE. The best option wins if its cosine similarity reaches the threshold; ties
+go to the earliest option.
+
+The node's options x buckets matrix is split by column:
+- common buckets (hit by at least 1/DENSE_RATIO of the options) are stored densely
+- rare buckets keep sparse postings, like keywords.KeywordMatrix, and only add to
+  the options they list
+With NumPy installed the dense columns are the rows of one matrix: a query gathers
+the rows of its buckets and scores every option in one matrix-vector product, and
+best_many() scores a batch of queries in one matrix product. NumPy is imported when
+the first matcher is built, never at startup. Without it, each dense column is one
+Python int holding every option's weight in its own 32-bit field: multiplying that
+int by the query's weight and adding it to an accumulator scores all options for
+the bucket in one C-level big-int operation, and the fields never carry into each
+other because a cosine is at most 1. Both store the same quantized weights, so they
+pick the same options, short of float32 rounding between near-equal scores.
+
+Only the NumPy path stays well under a millisecond per query on large menus. Measured
+at 5,000 options: about 0.35 ms per query and 0.3 s to build with NumPy, 1.6-1.9 ms
+and 1.4-1.7 s without it. The fallback is fine for menus of a few hundred options
+(about 0.1 ms per query at 100), so deployments with thousands of options per node need NumPy.
+
+Deterministic: crc32 is used instead of hash(), so every process, run and snapshot
+buckets the same way.
+"""
+import math
+import zlib
+from array import array
+from functools import lru_cache
+from itertools import chain
+
+DIM = 1 << 18
+NGRAM_SIZES = (3, 4)
+# Measured on the bundled scripts: paraphrases sharing a word stem with an option (or
+# with the options it leads to) score 0.12-0.35, unrelated requests mostly under 0.12
+DEFAULT_THRESHOLD = 0.12
+SCALE = 4095  # weights are quantized to 12 bits; a product fits 24, a whole cosine 32
+DENSE_RATIO = 16
+# Words that say nothing about the topic; left in, they make every question look alike
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been before being but by can could did do does doing
+for from had has have having he her here him his how i if in into is it its just let me might more
+most my no not now of off on or our out over she should so some than that the their them then there
+these they this those to too under up us very was we were what whats when where which who whom why will
+with would you your yours youre im ive id dont
+""".split())
+
+_numpy = None  # the numpy module once imported, False when it isn't installed
+
+
+def load_numpy():
+    """NumPy, imported on first use (it takes longer to import than the rest of startup), or None."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+@lru_cache(maxsize=1 << 16)
+def word_buckets(word, sizes=NGRAM_SIZES, dim=DIM):
+    """Buckets of the hashed character n-grams of one word, padded with spaces."""
+    padded = f" {word} "
+    mask = dim - 1
+    return tuple(zlib.crc32(padded[i:i + n].encode("utf-8")) & mask
+                 for n in sizes for i in range(len(padded) - n + 1))
+
+
+def ngram_counts(text, sizes=NGRAM_SIZES, dim=DIM):
+    """Bucket -> count for the hashed character n-grams of text's content words."""
+    counts = {}
+    for word in text.split():
+        if word not in STOPWORDS:
+            for bucket in word_buckets(word, sizes, dim):
+                counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+class SemanticMatcher:
+    """
+    One node's option texts as a matrix of quantized, normalized n-gram embeddings.
+    use_numpy: None uses NumPy when it is installed, False never does, True requires it.
+    """
+
+    def __init__(self, texts, use_numpy=None):
+        np = load_numpy() if use_numpy is not False else None
+        if use_numpy and np is None:
+            raise ImportError("NumPy is not installed")
+        self.size = len(texts)
+        doc_counts = [ngram_counts(text) for text in texts]
+        # Buckets no option has still count toward the query's norm, at the highest weight
+        self.unseen_idf = math.log(1 + self.size) + 1
+        self.matrix = None
+        if np is not None:
+            self._build_matrix(np, doc_counts)
+        else:
+            self._build_columns(doc_counts)
+
+    def _build_columns(self, doc_counts):
+        """Dense columns as big ints, rare ones as {option position: weight} postings."""
+        df = {}
+        for counts in doc_counts:
+            for bucket in counts:
+                df[bucket] = df.get(bucket, 0) + 1
+        self.idf = {bucket: math.log((1 + self.size) / (1 + n)) + 1 for bucket, n in df.items()}
+
+        columns = {}
+        for pos, counts in enumerate(doc_counts):
+            vector = {bucket: (1 + math.log(count)) * self.idf[bucket] for bucket, count in counts.items()}
+            norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+            for bucket, w in vector.items():
+                columns.setdefault(bucket, {})[pos] = round(w / norm * SCALE)
+        self.dense, self.sparse = {}, {}
+        for bucket, column in columns.items():
+            if len(column) * DENSE_RATIO >= self.size:
+                fields = array("I", bytes(4 * self.size))
+                for pos, w in column.items():
+                    fields[pos] = w
+                self.dense[bucket] = int.from_bytes(fields.tobytes(), "little")
+            else:
+                self.sparse[bucket] = column
+
+    def _build_matrix(self, np, doc_counts):
+        """
+        The same weights with NumPy: self.dense maps a common bucket to its row of
+        self.matrix, self.sparse a rare one to its (start, end) slice of self.rows
+        (option positions) and self.values.
+        """
+        lengths = np.fromiter(map(len, doc_counts), np.int64, self.size)
+        total = int(lengths.sum())
+        positions = np.repeat(np.arange(self.size), lengths)
+        buckets = np.fromiter(chain.from_iterable(doc_counts), np.int64, total)
+        counts = np.fromiter(chain.from_iterable(counts.values() for counts in doc_counts), np.float64, total)
+        unique, column = np.unique(buckets, return_inverse=True)
+        df = np.bincount(column, minlength=len(unique))
+        idf = np.log((1 + self.size) / (1 + df)) + 1
+        self.idf = dict(zip(unique.tolist(), idf.tolist()))
+
+        weights = (1 + np.log(counts)) * idf[column]
+        norms = np.sqrt(np.bincount(positions, weights=weights * weights, minlength=self.size))
+        norms[norms == 0] = 1.0
+        weights = np.rint(weights / norms[positions] * SCALE)
+
+        common = df * DENSE_RATIO >= self.size
+        row_of = np.cumsum(common) - 1  # a common column's row in the matrix
+        is_dense = common[column]
+        self.matrix = np.zeros((int(common.sum()), self.size), np.float32)
+        self.matrix[row_of[column[is_dense]], positions[is_dense]] = weights[is_dense]
+        self.dense = dict(zip(unique[common].tolist(), range(len(self.matrix))))
+
+        rare = ~is_dense
+        order = np.argsort(column[rare], kind="stable")
+        self.rows = positions[rare][order].astype(np.int32)
+        self.values = weights[rare][order].astype(np.float32)
+        rare_columns, starts = np.unique(column[rare][order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        self.sparse = dict(zip(unique[rare_columns].tolist(), zip(starts.tolist(), ends.tolist())))
+
+    def embed(self, text):
+        """The query's quantized, normalized vector, restricted to buckets some option has."""
+        idf, unseen = self.idf, self.unseen_idf
+        vector, total = {}, 0.0
+        for bucket, count in ngram_counts(text).items():
+            w = (1 + math.log(count)) * idf.get(bucket, unseen)
+            total += w * w
+            if bucket in idf:
+                vector[bucket] = w
+        norm = math.sqrt(total) or 1.0
+        return {bucket: round(w / norm * SCALE) for bucket, w in vector.items()}
+
+    def scores(self, text):
+        """
+        Without NumPy (see matrix_scores otherwise).
+        (fields, extra): fields[pos] is every option's score from the common buckets,
+        extra maps the options hit by rare buckets to what those add. Scores are in
+        units of 1 / SCALE**2.
+        """
+        dense, sparse = self.dense, self.sparse
+        total, extra = 0, {}
+        for bucket, qw in self.embed(text).items():
+            column = dense.get(bucket)
+            if column is not None:
+                total += qw * column
+            else:
+                for pos, w in sparse[bucket].items():
+                    extra[pos] = extra.get(pos, 0) + qw * w
+        fields = array("I")
+        fields.frombytes(total.to_bytes(4 * self.size, "little"))
+        return fields, extra
+
+    def matrix_scores(self, queries):
+        """Every option's score for each embedded query, as a queries x options array (NumPy only)."""
+        np = load_numpy()
+        sparse = []
+        rows, at, weights = [], [], []
+        for i, query in enumerate(queries):
+            for bucket, qw in query.items():
+                row = self.dense.get(bucket)
+                if row is not None:
+                    rows.append(row)
+                    at.append(i)
+                    weights.append(qw)
+                else:
+                    sparse.append((i, bucket, qw))
+        if rows:
+            # Only the rows the queries use: gathering them costs more than the product itself
+            used, inverse = np.unique(rows, return_inverse=True)
+            q = np.zeros((len(queries), len(used)), np.float32)
+            q[at, inverse] = weights
+            scores = q @ self.matrix[used]
+        else:
+            scores = np.zeros((len(queries), self.size), np.float32)
+        for i, bucket, qw in sparse:
+            start, end = self.sparse[bucket]
+            scores[i, self.rows[start:end]] += qw * self.values[start:end]
+        return scores
+
+    def _best_row(self, row, threshold):
+        top = row.max()
+        if top == 0 or top < threshold * SCALE * SCALE:
+            return None
+        return int(row.argmax())  # the earliest of equal scores
+
+    def best(self, text, threshold=DEFAULT_THRESHOLD):
+        """Position of the most similar option (earliest on ties), or None below threshold."""
+        if not self.size:
+            return None
+        if self.matrix is not None:
+            return self._best_row(self.matrix_scores([self.embed(text)])[0], threshold)
+        fields, extra = self.scores(text)
+        top = max(fields)
+        for pos, score in extra.items():
+            if fields[pos] + score > top:
+                top = fields[pos] + score
+        if top == 0 or top < threshold * SCALE * SCALE:
+            return None
+        earliest = fields.index(top) if top in fields else self.size
+        for pos, score in extra.items():
+            if pos < earliest and fields[pos] + score == top:
+                earliest = pos
+        return earliest
+
+    def best_many(self, texts, threshold=DEFAULT_THRESHOLD):
+        """best() for a batch of utterances; with NumPy they are scored as one matrix product."""
+        if self.matrix is None or not self.size:
+            return [self.best(text, threshold) for text in texts]
+        scores = self.matrix_scores([self.embed(text) for text in texts])
+        return [self._best_row(row, threshold) for row in scores]
@@ -0,0 +1,253 @@
+"""
+Asyncio chat server: many concurrent conversations over the shared chatbot tree.
+
+The protocol is plain lines of UTF-8 over TCP, so `nc localhost 8765` works as a client.
+After each turn the server sends a line starting with PROMPT_PREFIX holding the input
+prompt, which tells clients the turn's output is complete. When the user exits the
+server sends the goodbye line and closes the connection.
+
+With --history-dir every turn is logged (see history.py) and conversations can be
+resumed. The server's first line is SESSION_PREFIX plus the connection's session id;
+a client that sends "SESSION <id>" as its first line instead picks up that session
+where it left off, even after a server restart.
+
+With --watch the scripts are reloaded when they change on disk (see hotreload.py).
+Conversations in progress stay on the version they started with, or with
+--reload-policy migrate move to the new one at their next turn.
+
+Behind cluster.py's router (routed=True) each connection instead starts with a
+header line from the router, ROUTE_PREFIX plus the session id and "new" or
+"resume"; the router handles the client's own "SESSION <id>" line.
+
+Usage: python server.py --port 8765 --history-dir history/ --watch
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import history
+import instrumentation
+import Main
+from hotreload import TreeVersions
+from Main import CHOOSING, SCRIPTS_MENU, ConversationSession, chatbot
+from render import AsyncRenderer, SlowClientError
+
+PROMPT_PREFIX = "> "
+SESSION_PREFIX = "SESSION "
+ROUTE_PREFIX = "ROUTE "
+WELCOME = "Welcome to the Ultimate Chatbot Experience!"
+
+
+class ChatServer:
+    """
+    Serves one ConversationSession per connection. The tree is shared and only read.
+    Inputs longer than offload_chars are matched on a thread pool so a huge paste
+    can't hold up the event loop. Short ones, almost all of them, are matched inline
+    because that's cheaper than a thread hop.
+    Pass a history.HistoryLog as log to record turns and let clients resume sessions,
+    and a hotreload.TreeVersions as versions to serve its newest tree instead of root;
+    reload_policy "pin" keeps each session on the version it started with, "migrate"
+    moves it to the newest version at its next turn.
+    routed=True runs it as a cluster.py worker (see the module docstring).
+    Output goes through a render.AsyncRenderer per connection: one write per turn,
+    and a client that reads nothing for drain_timeout seconds is disconnected (its
+    session stays resumable) instead of buffering output without bound.
+    Sessions whose client disconnected are kept for resuming, at most max_detached
+    of them (least recently detached dropped first) for up to detached_ttl seconds.
+    A dropped session's turns stay in the log, so the next server start can resume it.
+    saved overrides the sessions loaded from log at startup (see cluster.py).
+    new_session_id makes the id of each new session (a random uuid by default); a
+    session is never started under an id the client picked.
+    """
+
+    def __init__(self, root=chatbot, offload_chars=256, max_line=64 * 1024, executor=None, log=None,
+                 versions=None, reload_policy="pin", routed=False, color=True, drain_timeout=30.0,
+                 max_detached=10000, detached_ttl=3600.0, saved=None, clock=time.monotonic, new_session_id=None):
+        self._root = root
+        self.color = color
+        self.drain_timeout = drain_timeout
+        self.routed = routed
+        self.versions = versions
+        self.reload_policy = reload_policy
+        self.offload_chars = offload_chars
+        self.max_line = max_line
+        self.executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="match")
+        self.log = log
+        if saved is None:
+            saved = history.load_sessions(log.directory) if log is not None else {}
+        self.saved = saved
+        self.max_detached = max_detached
+        self.detached_ttl = detached_ttl
+        self.clock = clock
+        self.new_session_id = new_session_id or (lambda: uuid.uuid4().hex)
+        # Unfinished sessions whose client disconnected since startup: session id -> (session, expiry)
+        self.detached = OrderedDict()
+        self.active = 0
+        self.served = 0
+
+    @property
+    def root(self):
+        return self.versions.current if self.versions is not None else self._root
+
+    def resume(self, session_id):
+        """A session restored from the log, or None if session_id is unknown or finished."""
+        detached = self.detached.pop(session_id, None)
+        if detached is not None:
+            session, expires = detached
+            return session if expires > self.clock() else None
+        saved = self.saved.pop(session_id, None)
+        if saved is None:
+            return None
+        return ConversationSession.restore(self.root, saved.path, saved.state, session_id, self.log, self.color)
+
+    def detach(self, session):
+        """Keep a session whose client went away, dropping the oldest and expired ones."""
+        now = self.clock()
+        detached = self.detached
+        detached[session.session_id] = (session, now + self.detached_ttl)
+        detached.move_to_end(session.session_id)
+        while detached:
+            _, (_, expires) = next(iter(detached.items()))
+            if len(detached) <= self.max_detached and expires > now:
+                break  # entries are in detach order, so the rest expire later
+            detached.popitem(last=False)
+
+    async def send_turn(self, renderer, session, lines):
+        renderer.emit(lines)
+        if not session.finished:
+            if session.state == CHOOSING:
+                renderer.emit(session.menu())
+            renderer.emit([PROMPT_PREFIX + session.input_prompt()])
+        renderer.flush()
+        await renderer.drain()
+
+    async def open_session(self, reader):
+        """The connection's session and its greeting lines; reads the router's header when routed."""
+        session_id, action = None, "new"
+        if self.routed:
+            header = (await reader.readline()).decode("utf-8", errors="replace").split()
+            if len(header) == 3 and header[0] == ROUTE_PREFIX.strip():
+                session_id, action = header[1], header[2]
+        if action == "resume":
+            restored = self.resume(session_id)
+            if restored is not None:
+                return restored, [f"Resumed session {session_id}."]
+            session_id = None  # the client's id, unknown here: never reuse it for a new session
+            greeting = ["No saved session with that id, starting fresh."]
+        else:
+            greeting = [WELCOME]
+        if session_id is None:
+            session_id = self.new_session_id()
+        return ConversationSession(self.root, session_id=session_id, history=self.log, color=self.color), greeting
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        renderer = AsyncRenderer(writer, self.color, drain_timeout=self.drain_timeout)
+        self.active += 1
+        session = None
+        try:
+            session, greeting = await self.open_session(reader)
+            if self.log is not None or self.routed:
+                renderer.emit([f"{SESSION_PREFIX}{session.session_id}"])
+            await self.send_turn(renderer, session, greeting)
+            first = not self.routed
+            while not session.finished:
+                try:
+                    raw = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    renderer.emit(["Line too long, closing."])
+                    renderer.flush()
+                    break
+                if not raw:
+                    break  # client went away
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                if first and self.log is not None and line.startswith(SESSION_PREFIX):
+                    first = False
+                    restored = self.resume(line[len(SESSION_PREFIX):].strip())
+                    if restored is None:
+                        await self.send_turn(renderer, session, ["No saved session with that id, starting fresh."])
+                    else:
+                        session = restored
+                        await self.send_turn(renderer, session, [f"Resumed session {session.session_id}."])
+                    continue
+                first = False
+                if self.reload_policy == "migrate" and session.stack.main_menu is not self.root:
+                    session.migrate(self.root)
+                if len(line) > self.offload_chars:
+                    lines = await loop.run_in_executor(self.executor, session.send, line)
+                else:
+                    lines = session.send(line)
+                await self.send_turn(renderer, session, lines)
+        except SlowClientError:
+            writer.transport.abort()  # closing politely would wait on the unread output
+        except ConnectionError:
+            pass
+        finally:
+            if self.log is not None and session is not None and not session.finished:
+                self.detach(session)
+            self.active -= 1
+            self.served += 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.handle, host, port, limit=self.max_line)
+
+
+async def serve(host, port, log=None, versions=None, reload_policy="pin", color=True):
+    server = await ChatServer(log=log, versions=versions, reload_policy=reload_policy, color=color).start(host, port)
+    addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+    print(f"Chat server listening on {addresses}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve chatbot conversations over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--metrics-file", help="enable matcher instrumentation and dump it to this file")
+    parser.add_argument("--metrics-format", choices=("json", "prometheus"), default="prometheus")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="seconds between dumps")
+    parser.add_argument("--history-dir", help="log every turn here and allow resuming sessions")
+    parser.add_argument("--semantic", action="store_true", help="match paraphrases by n-gram embedding as a last resort")
+    parser.add_argument("--no-color", action="store_true", help="send plain text instead of ANSI-colored replies")
+    parser.add_argument("--watch", action="store_true", help="reload the scripts when they change on disk")
+    parser.add_argument("--watch-interval", type=float, default=1.0, help="seconds between checks")
+    parser.add_argument("--reload-policy", choices=("pin", "migrate"), default="pin",
+                        help="keep running sessions on their version, or move them to the new one")
+    args = parser.parse_args(argv)
+
+    if args.semantic:
+        Main.enable_semantic_stage()
+        # The snapshot has no embeddings; build them now rather than on the event loop at the first miss
+        Main.compile_tree(chatbot)
+    exporter = None
+    if args.metrics_file:
+        stats = Main.enable_instrumentation()
+        make = instrumentation.prometheus_exporter if args.metrics_format == "prometheus" else instrumentation.json_dumper
+        exporter = make(stats, args.metrics_file, args.metrics_interval).start()
+    log = history.HistoryLog(args.history_dir) if args.history_dir else None
+    # Start from the tree already loaded (lazily, from the snapshot) rather than compiling a second one
+    versions = TreeVersions(SCRIPTS_MENU, args.watch_interval, root=chatbot).start() if args.watch else None
+    try:
+        asyncio.run(serve(args.host, args.port, log, versions, args.reload_policy, not args.no_color))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if exporter is not None:
+            exporter.stop()
+        if versions is not None:
+            versions.stop()
+        if log is not None:
+            log.close()
+
+
+if __name__ == "__main__":
+    main()
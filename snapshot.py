@@ -0,0 +1,341 @@
+"""
+Engine snapshots: the compiled conversation tree, with every node's OptionIndex and
+pre-rendered replies, pickled to disk so the next start can skip loading and
+indexing the scripts.
+
+Every followup menu (a character's conversation, and each conversation it leads to)
+is pickled as a section of its own, and loading a snapshot only unpickles the main
+menu. A section is unpickled, from the memory-mapped file, the first time someone
+looks inside it (LazySection), and its own followups stay sections until they are
+visited in turn. Startup time and memory stay flat however many characters the
+scripts have, and conversations nobody navigates into are never loaded.
+
+    magic "CHSNAP", then a pickled header:
+        {"version": FORMAT_VERSION, "python": (major, minor), "settings": ...,
+         "sources": [script paths], "digest": blake2b of the sources' contents,
+         "code": blake2b of the CODE_MODULES' sources}
+    then the pickled main menu and one pickle per section, each followup menu
+    in them replaced by a reference to its section
+    then the pickled table {"offsets": [main menu, section 0, ...], "vocabulary": terms}
+    and, last, the table's offset as a u64
+
+A snapshot is only used when its header matches: same format version, same Python,
+same match settings, a digest that still equals the hash of every source file, and
+the same code in CODE_MODULES. The pickled tree holds whatever those modules built
+(resolved speakers and emoji, rendered replies, indexes), so a change to any of them
+(a new field, a different tokenizer) makes the snapshot stale.
+Checking that reads the files' bytes but never parses them, so a valid snapshot
+loads without importing json, or the pickle module (only the C unpickler is used),
+both of which import re. A stale, foreign or damaged snapshot makes load() return
+None, and the caller rebuilds and saves. Unpickling only resolves the few classes in
+SAFE_GLOBALS (the header and table none at all), so a file planted in the scripts
+directory can't run code when it is loaded. The mapping keeps the file that was loaded
+readable even after a newer snapshot replaces it.
+
+Nothing is pickled by reference to Main, which may be running as __main__: option
+indexes are stored by state (index_type's __getstate__/__setstate__) and the shared
+keyword vocabulary by its terms, once, in the table. Indexes get fresh uids when
+loaded, since the match cache is keyed on them.
+"""
+import hashlib
+import io
+import mmap
+import os
+import struct
+import sys
+import threading
+from collections.abc import MutableMapping
+
+import keywords
+
+try:
+    from _pickle import Unpickler, UnpicklingError
+except ImportError:
+    from pickle import Unpickler, UnpicklingError
+
+MAGIC = b"CHSNAP"
+FORMAT_VERSION = 3
+TRAILER = struct.Struct("<Q")
+# Modules whose output is pickled into a snapshot: the script metadata (dialogue), the
+# rendered replies and OptionIndex (Main) and its matchers
+CODE_MODULES = ("Main.py", "dialogue.py", "fuzzy.py", "keywords.py", "semantic.py", "substring.py")
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+# The only classes and functions a snapshot may refer to. Anything else (a file
+# crafted to run code when unpickled) fails to load like a damaged snapshot does.
+SAFE_GLOBALS = frozenset([
+    ("builtins", "set"), ("builtins", "frozenset"),
+    ("array", "array"), ("array", "_array_reconstructor"),
+    ("fuzzy", "DifflibMatcher"), ("fuzzy", "NgramMatcher"),
+    ("keywords", "KeywordMatrix"), ("keywords", "Vocabulary"),
+    ("semantic", "SemanticMatcher"),
+    ("substring", "AhoCorasick"), ("substring", "SuffixIndex"), ("substring", "SubstringMatcher"),
+    # SemanticMatcher's arrays when NumPy is installed, under its 1.x and 2.x module names
+    ("numpy", "dtype"), ("numpy", "ndarray"),
+    ("numpy.core.numeric", "_frombuffer"), ("numpy._core.numeric", "_frombuffer"),
+    ("numpy.core.multiarray", "_reconstruct"), ("numpy._core.multiarray", "_reconstruct"),
+])
+# What a snapshot that can't be used looks like when it is opened
+UNUSABLE = (OSError, EOFError, UnpicklingError, AttributeError, ImportError, IndexError, KeyError,
+            TypeError, ValueError)
+
+
+def content_digest(sources):
+    """Hash of the sources' paths and contents, in order."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in sources:
+        with open(path, "rb") as f:
+            data = f.read()
+        name = os.path.basename(path).encode("utf-8")
+        h.update(len(name).to_bytes(4, "little") + name + len(data).to_bytes(8, "little") + data)
+    return h.digest()
+
+
+def code_digest():
+    """Hash of the matcher code the pickled indexes come from."""
+    return content_digest([os.path.join(CODE_DIR, name) for name in CODE_MODULES])
+
+
+def make_header(sources, settings):
+    return {
+        "version": FORMAT_VERSION,
+        "python": tuple(sys.version_info[:2]),
+        "settings": settings,
+        "sources": [os.path.abspath(path) for path in sources],
+        "digest": content_digest(sources),
+        "code": code_digest(),
+    }
+
+
+def persistent_id(obj, index_type):
+    if type(obj) is index_type:
+        return ("index", obj.__getstate__())
+    if obj is keywords.VOCABULARY:
+        return ("vocabulary", None)  # its terms are stored once, in the table
+    return None
+
+
+class _DataUnpickler(Unpickler):
+    """Unpickles plain data only (the header and the table): no classes, no functions."""
+
+    def find_class(self, module, name):
+        raise UnpicklingError(f"{module}.{name} is not allowed in a snapshot header")
+
+
+class _Unpickler(Unpickler):
+    def __init__(self, file, snapshot):
+        super().__init__(file)
+        self.snapshot = snapshot
+
+    def find_class(self, module, name):
+        if (module, name) not in SAFE_GLOBALS:
+            raise UnpicklingError(f"{module}.{name} is not allowed in a snapshot")
+        return super().find_class(module, name)
+
+    def persistent_load(self, pid):
+        kind, state = pid
+        if kind == "index":
+            index_type = self.snapshot.index_type
+            index = index_type.__new__(index_type)
+            index.__setstate__(state)
+            return index
+        if kind == "vocabulary":
+            return self.snapshot.vocabulary()
+        if kind == "section":
+            return LazySection(self.snapshot, state)
+        raise UnpicklingError(f"Unknown persistent id {kind!r}")
+
+
+def restore_vocabulary(ids):
+    """
+    Put the snapshot's terms into the shared vocabulary, so nodes indexed later keep
+    using the same columns. If this process already gave a term another id, the
+    snapshot's matrices keep a vocabulary of their own instead.
+    """
+    vocabulary = keywords.VOCABULARY
+    for term, term_id in sorted(ids.items(), key=lambda item: item[1]):
+        if vocabulary.add(term) != term_id:
+            own = keywords.Vocabulary()
+            own.ids = dict(ids)
+            return own
+    return vocabulary
+
+
+class Snapshot:
+    """A memory-mapped snapshot file whose parts are unpickled on demand."""
+
+    def __init__(self, buffer, index_type):
+        self.buffer = buffer
+        self.index_type = index_type
+        (table_at,) = TRAILER.unpack_from(buffer, len(buffer) - TRAILER.size)
+        table = _DataUnpickler(io.BytesIO(buffer[table_at:len(buffer) - TRAILER.size])).load()
+        self.offsets = table["offsets"] + [table_at]
+        self.vocabulary_ids = table["vocabulary"]
+        self._vocabulary = None
+        self.lock = threading.RLock()  # sessions on other threads may open the same section
+
+    def vocabulary(self):
+        if self._vocabulary is None:  # every matrix refers to it; restore it once
+            self._vocabulary = restore_vocabulary(self.vocabulary_ids)
+        return self._vocabulary
+
+    def part(self, number):
+        """Unpickle part number: 0 is the main menu, n + 1 section n."""
+        start, end = self.offsets[number], self.offsets[number + 1]
+        with self.lock:
+            return _Unpickler(io.BytesIO(self.buffer[start:end]), self).load()
+
+
+class LazySection(MutableMapping):
+    """
+    A followup menu in a snapshot: a dict-like view of the node that unpickles its
+    section on first access. Followups below it come back as further LazySections,
+    so a subtree is only materialized once someone navigates into it. Pickling it
+    again writes a plain dict.
+    """
+
+    __slots__ = ("_snapshot", "_number", "_data")
+
+    def __init__(self, snapshot, number):
+        self._snapshot = snapshot
+        self._number = number
+        self._data = None
+
+    def _load(self):
+        with self._snapshot.lock:
+            if self._data is None:
+                self._data = self._snapshot.part(self._number + 1)
+        return self._data
+
+    @property
+    def materialized(self):
+        return self._data is not None
+
+    def _fields(self):
+        return self._load() if self._data is None else self._data
+
+    def __getitem__(self, key):
+        return self._fields()[key]
+
+    def __setitem__(self, key, value):
+        self._fields()[key] = value
+
+    def __delitem__(self, key):
+        del self._fields()[key]
+
+    def __iter__(self):
+        return iter(self._fields())
+
+    def __len__(self):
+        return len(self._fields())
+
+    def __contains__(self, key):
+        return key in self._fields()
+
+    def __reduce__(self):
+        return dict, (), None, None, iter(self._fields().items())
+
+    def __repr__(self):
+        state = "loaded" if self.materialized else "lazy"
+        return f"<LazySection {self._number} {state}>"
+
+
+def load_sections(tree):
+    """Unpickle every section of a loaded tree now, e.g. before forking workers that should share them."""
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        for option in node["options"].values():  # loads a LazySection
+            if "followup" in option:
+                stack.append(option["followup"])
+            elif "options" in option:
+                stack.append(option)
+    return tree
+
+
+def save(path, tree, sources, index_type, settings=None):
+    """
+    Write the compiled tree atomically; sources are the script files it was built from.
+    It goes to a uniquely named temporary file first, so processes starting at the same
+    time never write into each other's snapshot.
+    """
+    import pickle
+    import tempfile
+
+    # Every followup menu below the root becomes a section: a character's conversation
+    # and each conversation it leads to
+    sections, section_numbers = [], {}
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        for option in node.get("options", {}).values():
+            if "followup" in option:
+                followup = option["followup"]
+                if id(followup) not in section_numbers:
+                    section_numbers[id(followup)] = len(sections)
+                    sections.append(followup)
+                    stack.append(followup)
+            elif "options" in option:
+                stack.append(option)
+
+    class Pickler(pickle.Pickler):
+        def __init__(self, file, part):
+            super().__init__(file, pickle.HIGHEST_PROTOCOL)
+            self.part = part
+
+        def persistent_id(self, obj):
+            number = section_numbers.get(id(obj))
+            if number is not None and obj is not self.part:
+                return ("section", number)
+            return persistent_id(obj, index_type)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            pickle.dump(make_header(sources, settings), f, pickle.HIGHEST_PROTOCOL)
+            offsets = []
+            for part in [tree, *sections]:
+                offsets.append(f.tell())
+                Pickler(f, part).dump(part)
+            table_at = f.tell()
+            pickle.dump({"offsets": offsets, "vocabulary": keywords.VOCABULARY.ids}, f, pickle.HIGHEST_PROTOCOL)
+            f.write(TRAILER.pack(table_at))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        return None
+    return _DataUnpickler(f).load()
+
+
+def is_current(header, settings=None):
+    """True when a snapshot header matches this format, Python, settings, matcher code and the sources on disk."""
+    if (header.get("version") != FORMAT_VERSION or header.get("python") != tuple(sys.version_info[:2])
+            or header.get("settings") != settings):
+        return False
+    try:
+        return content_digest(header["sources"]) == header["digest"] and code_digest() == header["code"]
+    except OSError:
+        return False  # a source was removed or renamed
+
+
+def load(path, index_type, settings=None):
+    """
+    The compiled tree stored at path, with its followup menus still to be unpickled
+    (see LazySection), or None when there is no usable, current snapshot.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = read_header(f)
+            if header is None or not is_current(header, settings):
+                return None
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return Snapshot(buffer, index_type).part(0)
+    except UNUSABLE:
+        return None
@@ -0,0 +1,221 @@
+"""
+Substring stage of match_option: find the options whose text contains the input, or is
+contained in it, without testing every option in turn.
+
+Winner rule: the earliest option, in the node's option order, satisfying either
+direction. That is what the old linear scan returned, so results are unchanged; it
+just no longer depends on scanning to find out.
+
+- option text inside the input: an Aho-Corasick automaton over all option texts finds
+  every contained option in one pass over the input
+- input inside an option text: a suffix array over all option texts finds the block of
+  suffixes starting with the input by binary search, and a block-wise range-minimum
+  table gives the earliest option owning any of them
+"""
+from array import array
+from collections import deque
+from itertools import compress, islice
+from operator import eq
+
+SEPARATOR = "\x00"  # never survives normalize(), so it can end every text safely
+BLOCK = 32
+KEY_BYTES = 16  # bytes of each suffix compared per sorting pass
+NONE = 1 << 30  # "no option" in the int arrays
+
+
+def _char_key(state, char):
+    return (state << 21) | ord(char)
+
+
+class AhoCorasick:
+    """Multi-pattern automaton reporting the smallest pattern id found in a text."""
+
+    def __init__(self, patterns):
+        self.goto = {}  # _char_key(state, char) -> state
+        own = [NONE]
+        children = [[]]
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                key = _char_key(state, char)
+                nxt = self.goto.get(key)
+                if nxt is None:
+                    nxt = self.goto[key] = len(own)
+                    own.append(NONE)
+                    children.append([])
+                    children[state].append((char, nxt))
+                state = nxt
+            own[state] = min(own[state], pattern_id)
+
+        # Breadth-first fail links; best[s] = smallest id ending at s or any fail-suffix of it
+        self.fail = array("i", [0]) * len(own)
+        self.best = array("i", own)
+        queue = deque()
+        for _, child in children[0]:
+            queue.append(child)
+        while queue:
+            state = queue.popleft()
+            for char, child in children[state]:
+                f = self.fail[state]
+                while f and _char_key(f, char) not in self.goto:
+                    f = self.fail[f]
+                target = self.goto.get(_char_key(f, char), 0)
+                self.fail[child] = target if target != child else 0
+                self.best[child] = min(self.best[child], self.best[self.fail[child]])
+                queue.append(child)
+
+    def first(self, text):
+        """Smallest id of a pattern occurring in text, or None."""
+        goto, fail, best = self.goto, self.fail, self.best
+        found = best[0]  # the empty pattern occurs everywhere
+        state = 0
+        for char in text:
+            if found == 0:
+                break
+            key = _char_key(state, char)
+            while state and key not in goto:
+                state = fail[state]
+                key = _char_key(state, char)
+            state = goto.get(key, 0)
+            if best[state] < found:
+                found = best[state]
+        return None if found == NONE else found
+
+
+class SuffixIndex:
+    """Suffix array over texts, answering "which earliest text contains this string?"."""
+
+    def __init__(self, texts):
+        self.count = len(texts)
+        self.joined = SEPARATOR.join(texts) + SEPARATOR
+        owners = array("i")
+        for text_id, text in enumerate(texts):
+            owners.extend([text_id] * (len(text) + 1))
+        self.suffixes = self._sort_suffixes(texts)
+        self.owners = array("i", map(owners.__getitem__, self.suffixes))
+        self._build_rmq()
+
+    @staticmethod
+    def _sort_suffixes(texts):
+        """
+        Array of the start positions (in SEPARATOR.join(texts)) of every suffix, in
+        order of the suffix cut at its text's end.
+        Characters are renumbered 1..n and encoded a byte each (four for huge
+        alphabets), with KEY_BYTES of zeros after every text, so KEY_BYTES read from
+        anywhere as one int are a suffix's next characters cut at its text's end.
+        Suffixes are sorted by their first window, then every group still tied by the
+        next one, and so on; a group tied on a window that reaches the text's end holds
+        equal suffixes and is done. Each sort key packs the group, the window and the
+        position into one int. Only those are sorted, never copies of whole suffixes,
+        so memory stays linear in the text length.
+        """
+        alphabet = sorted(set().union(*texts))
+        size = 1 if len(alphabet) < 256 else 4
+        chunk = KEY_BYTES // size * size
+        pad = chunk // size
+        dense = (SEPARATOR * pad).join(texts) + SEPARATOR * pad
+        dense = dense.translate({ord(char): n for n, char in enumerate(alphabet, 1)})
+        data = dense.encode("latin-1" if size == 1 else "utf-32-be")
+        last_char = (1 << 8 * size) - 1
+
+        # at[i]: where position i of the joined texts starts in data
+        starts, at = array("i"), array("q")
+        position = offset = 0
+        for text in texts:
+            starts.extend(range(position, position + len(text)))
+            at.extend(range(offset, offset + (len(text) + 1) * size, size))
+            position += len(text) + 1
+            offset += (len(text) + pad) * size
+        index_bits = max(1, position.bit_length())
+        index_mask = (1 << index_bits) - 1
+        group_shift = 8 * chunk + index_bits
+        from_bytes = int.from_bytes
+
+        tied = [(0, len(starts))] if starts else []
+        width = 0
+        while tied:
+            # One sort for every tied group; the group's start leads the key, so each stays in place
+            slots = [pos for lo, hi in tied for pos in range(lo, hi)]
+            keys = sorted([lo << group_shift | from_bytes(data[at[i] + width:at[i] + width + chunk], "big") << index_bits
+                           | i for lo, hi in tied for i in starts[lo:hi]])
+            for j, slot in enumerate(slots):
+                key = keys[j]
+                starts[slot] = key & index_mask
+                keys[j] = key >> index_bits
+            tied = []
+            first = previous = None
+            # Positions whose key equals the one before, found without a Python-level pass
+            for j in compress(range(1, len(keys)), map(eq, keys, islice(keys, 1, None))):
+                if previous is None or j != previous + 1:
+                    if first is not None and keys[first] & last_char:
+                        tied.append((slots[first], slots[previous] + 1))
+                    first = j - 1
+                previous = j
+            if first is not None and keys[first] & last_char:
+                tied.append((slots[first], slots[previous] + 1))
+            width += chunk
+        return starts
+
+    def _build_rmq(self):
+        owners = self.owners
+        mins = [min(owners[i:i + BLOCK]) for i in range(0, len(owners), BLOCK)]
+        self.table = [mins]
+        width = 1
+        while 2 * width <= len(mins):
+            prev = self.table[-1]
+            self.table.append([min(prev[i], prev[i + width]) for i in range(len(prev) - width)])
+            width *= 2
+
+    def _range_min(self, lo, hi):
+        """Smallest owner in ranks [lo, hi)."""
+        owners = self.owners
+        first_block, last_block = lo // BLOCK + 1, hi // BLOCK
+        if first_block >= last_block:
+            return min(owners[lo:hi])
+        best = min(min(owners[lo:first_block * BLOCK], default=NONE), min(owners[last_block * BLOCK:hi], default=NONE))
+        span = last_block - first_block
+        level = span.bit_length() - 1
+        row = self.table[level]
+        return min(best, row[first_block], row[last_block - (1 << level)])
+
+    def _lower_bound(self, text, upper):
+        """First rank whose suffix prefix is >= text (or > text when upper)."""
+        joined, suffixes, size = self.joined, self.suffixes, len(text)
+        lo, hi = 0, len(suffixes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = suffixes[mid]
+            prefix = joined[start:start + size]
+            if prefix < text or (upper and prefix == text):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def first(self, text):
+        """Smallest id of a text containing text, or None."""
+        if not text:
+            return 0 if self.count else None
+        lo = self._lower_bound(text, False)
+        hi = self._lower_bound(text, True)
+        if lo >= hi:
+            return None
+        return self._range_min(lo, hi)
+
+
+class SubstringMatcher:
+    """Both directions of the substring stage over one node's normalized option texts."""
+
+    def __init__(self, texts):
+        self.contained = AhoCorasick(texts)
+        self.containing = SuffixIndex(texts)
+
+    def first(self, text):
+        """Position of the earliest option equal to, containing, or contained in text; or None."""
+        a = self.contained.first(text)
+        b = self.containing.first(text)
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return min(a, b)
@@ -0,0 +1,36 @@
+import io
+import json
+
+import pytest
+
+from batch import resolve_record, run_batch
+
+
+def test_resolves_utterance_at_path():
+    result = resolve_record({"path": ["1"], "utterance": "advice for young people"})
+    assert result["key"] == "3"
+    assert "Kalam" in result["speaker"]
+
+
+@pytest.mark.parametrize("path", ["12", "1", 1, None, {"1": "2"}, ["1", 2]])
+def test_rejects_path_that_is_not_a_list_of_keys(path):
+    result = resolve_record({"path": path, "utterance": "hello"})
+    assert result["error"].startswith("bad path")
+    assert "key" not in result
+
+
+def test_missing_path_means_main_menu():
+    assert resolve_record({"utterance": "2"})["key"] == "2"
+
+
+def test_unknown_key_is_an_error():
+    assert resolve_record({"path": ["99"], "utterance": "x"})["error"].startswith("bad path")
+
+
+def test_run_batch_keeps_order_and_reports_bad_lines():
+    lines = [json.dumps({"path": [], "utterance": str(i % 3 + 1)}) + "\n" for i in range(7)] + ["not json\n"]
+    out = io.StringIO()
+    assert run_batch(lines, out, workers=0, chunk_size=3) == 8
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r.get("key") for r in results[:7]] == [str(i % 3 + 1) for i in range(7)]
+    assert results[7]["error"].startswith("bad record")
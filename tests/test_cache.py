@@ -0,0 +1,82 @@
+import pytest
+
+import Main
+from cache import MISSING, MatchCache
+from Main import CACHE_MAX_CHARS, OptionIndex, match_option
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = MatchCache(maxsize=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"  # now b is the least recently used
+    cache.put("c", None)
+    assert cache.get("b") is MISSING
+    assert (cache.get("a"), cache.get("c")) == ("1", None)  # a cached "no match" is a hit too
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 3, 1, 1)
+    assert stats["hit_rate"] == 0.75
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = MatchCache(maxsize=10, ttl=60, clock=clock)
+    cache.put("a", "1")
+    clock.now = 30
+    cache.put("b", "2")
+    clock.now = 60
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == "2"
+    clock.now = 90
+    assert cache.get("b") is MISSING
+    stats = cache.stats()
+    assert (stats["size"], stats["expirations"], stats["misses"], stats["evictions"]) == (0, 2, 2, 0)
+
+
+def test_invalidate_drops_every_entry():
+    cache = MatchCache(maxsize=10)
+    cache.put("a", "1")
+    cache.invalidate()
+    assert len(cache) == 0
+    assert cache.get("a") is MISSING
+    assert cache.stats()["generation"] == 1
+
+
+def test_maxsize_must_be_positive():
+    with pytest.raises(ValueError):
+        MatchCache(maxsize=0)
+
+
+@pytest.fixture
+def match_cache(monkeypatch):
+    cache = MatchCache(maxsize=100)
+    monkeypatch.setattr(Main, "MATCH_CACHE", cache)
+    return cache
+
+
+def test_matches_are_cached_per_node(match_cache):
+    options = {"1": {"text": "Hello there"}, "2": {"text": "Goodbye"}}
+    index = OptionIndex(options)
+    assert match_option("goodbye!", options, index) == "2"
+    assert match_option("Goodbye", options, index) == "2"
+    assert (match_cache.misses, match_cache.hits) == (1, 1)
+    assert match_option("goodbye", options, OptionIndex(options)) == "2"  # another node: its own entry
+    assert len(match_cache) == 2
+
+
+def test_long_inputs_are_not_cached(match_cache):
+    options = {"1": {"text": "Hello there"}, "2": {"text": "Goodbye"}}
+    index = OptionIndex(options)
+    paste = "goodbye " + "x" * CACHE_MAX_CHARS
+    assert match_option(paste, options, index) == "2"
+    assert match_option(paste, options, index) == "2"
+    assert len(match_cache) == 0
+    assert match_cache.hits + match_cache.misses == 0
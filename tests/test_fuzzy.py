@@ -0,0 +1,34 @@
+import json
+import os
+
+import pytest
+
+from fuzzy import FUZZY_BACKENDS, DifflibMatcher, NgramMatcher, compare_backends, make_matcher
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fuzzy_corpus.json")
+
+
+def load_corpus():
+    """Every menu's normalized option texts with typos of them, plus a large synthetic menu of near-duplicates."""
+    with open(CORPUS, encoding="utf-8") as f:
+        return json.load(f)["groups"]
+
+
+@pytest.mark.parametrize("cutoff", [0.6, 0.8, 0.9])
+def test_ngram_backend_agrees_with_difflib_on_corpus(cutoff):
+    for group in load_corpus():
+        assert compare_backends(group["texts"], group["words"], "ngram", cutoff) == [], group["prompt"]
+
+
+def test_corpus_exercises_fuzzy_matches():
+    group = load_corpus()[-1]
+    matcher = DifflibMatcher(group["texts"])
+    hits = sum(matcher.best(word) is not None for word in group["words"])
+    assert 0 < hits < len(group["words"])
+
+
+def test_make_matcher():
+    assert isinstance(make_matcher(["a"]), NgramMatcher)
+    assert set(FUZZY_BACKENDS) == {"difflib", "ngram"}
+    with pytest.raises(ValueError):
+        make_matcher(["a"], "nope")
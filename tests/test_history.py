@@ -0,0 +1,182 @@
+import os
+import time
+
+import history
+from history import HistoryLog, decode_records, encode_record, load_sessions, read_history, segment_paths
+from Main import CHOOSING, LEAF, ConversationSession, chatbot
+
+
+def write_log(directory, records, **kwargs):
+    log = HistoryLog(str(directory), **kwargs)
+    for record in records:
+        log.append(*record)
+    log.close()
+    return log
+
+
+def test_records_round_trip():
+    record = ("s1", "advice 🙂", ("1", "3"), LEAF, False, 1234.5)
+    data = encode_record(*record) + encode_record("s2", "", (), CHOOSING, True, 1.0)
+    assert list(decode_records(data)) == [
+        ("s1", "advice 🙂", ("1", "3"), LEAF, False, 1234.5),
+        ("s2", "", (), CHOOSING, True, 1.0),
+    ]
+
+
+def test_torn_tail_is_skipped_on_replay(tmp_path):
+    write_log(tmp_path, [
+        ("s1", "1", ("1",), CHOOSING, False, 1.0),
+        ("s1", "3", ("1",), LEAF, False, 2.0),
+        ("s1", "menu", (), CHOOSING, False, 3.0),
+    ])
+    [segment] = segment_paths(str(tmp_path))
+    os.truncate(segment, os.path.getsize(segment) - 3)  # a crash in the middle of the last frame
+
+    saved = load_sessions(str(tmp_path))["s1"]
+    assert (saved.path, saved.state, saved.turns, saved.last_seen) == (("1",), LEAF, 2, 2.0)
+    assert [turn[1] for turn in read_history(str(tmp_path), "s1")] == ["1", "3"]
+
+
+def test_corrupt_frame_ends_the_segment():
+    first = encode_record("s1", "1", ("1",), CHOOSING, False, 1.0)
+    second = bytearray(encode_record("s1", "2", ("1",), LEAF, False, 2.0))
+    second[-1] ^= 0xFF
+    assert [r[1] for r in decode_records(first + bytes(second) + first)] == ["1"]
+
+
+def test_segments_rotate_and_replay_in_order(tmp_path):
+    records = [(f"s{i % 3}", str(i), (str(i % 5),), CHOOSING, False, float(i)) for i in range(40)]
+    write_log(tmp_path, records, segment_bytes=200)
+    assert len(segment_paths(str(tmp_path))) > 5
+
+    turns = read_history(str(tmp_path), "s1")
+    assert [t[1] for t in turns] == [str(i) for i in range(1, 40, 3)]
+    assert load_sessions(str(tmp_path))["s1"].path == ("2",)  # turn 37
+
+
+def test_every_run_starts_a_new_segment(tmp_path):
+    write_log(tmp_path, [("s1", "1", ("1",), CHOOSING, False, 1.0)])
+    write_log(tmp_path, [("s1", "3", ("1",), LEAF, False, 2.0)])
+    assert [os.path.basename(p) for p in segment_paths(str(tmp_path))] == ["00000001.log", "00000002.log"]
+    assert load_sessions(str(tmp_path))["s1"].turns == 2
+
+
+def test_ended_sessions_are_not_resumable(tmp_path):
+    write_log(tmp_path, [
+        ("s1", "1", ("1",), CHOOSING, False, 1.0),
+        ("s2", "2", ("2",), CHOOSING, False, 2.0),
+        ("s1", "exit", ("1",), "finished", True, 3.0),
+    ])
+    assert set(load_sessions(str(tmp_path))) == {"s2"}
+
+
+def test_session_resumes_from_the_log(tmp_path):
+    log = HistoryLog(str(tmp_path))
+    session = ConversationSession(chatbot, session_id="s1", history=log, color=False)
+    for choice in ("1", "3", "1", "1"):
+        session.send(choice)
+    assert session.state == LEAF
+    log.close()
+
+    saved = load_sessions(str(tmp_path))["s1"]
+    resumed = ConversationSession.restore(chatbot, saved.path, saved.state, session_id="s1")
+    assert resumed.stack.path == session.stack.path == ("1", "3", "1")
+    assert resumed.node is session.node
+    assert resumed.state == LEAF
+
+
+def test_resume_of_a_path_that_no_longer_exists_falls_back_to_the_main_menu():
+    resumed = ConversationSession.restore(chatbot, ("99", "1"), LEAF)
+    assert resumed.stack.path == ()
+    assert resumed.node is chatbot
+    assert resumed.state == CHOOSING
+
+
+def test_writer_flushes_in_batches_and_close_syncs_the_rest(tmp_path, monkeypatch):
+    syncs = []
+    monkeypatch.setattr(history.os, "fsync", syncs.append)
+    log = HistoryLog(str(tmp_path), fsync_interval=3600, flush_interval=0.01)
+    log.append("s1", "1", ("1",), CHOOSING, timestamp=1.0)
+    [segment] = segment_paths(str(tmp_path))
+    deadline = time.monotonic() + 5
+    while os.path.getsize(segment) == 0:
+        assert time.monotonic() < deadline, "the writer thread never flushed"
+        time.sleep(0.01)
+    assert syncs == []  # flushed to the OS, but not synced before fsync_interval
+
+    log.flush_interval = 3600  # anything appended now is only written by close()
+    time.sleep(0.05)
+    for i in range(100):
+        log.append("s1", str(i), ("1",), CHOOSING, timestamp=2.0 + i)
+    log.close()
+    assert len(syncs) == 1
+    assert len(read_history(str(tmp_path), "s1")) == 101
+
+
+def test_nothing_is_written_until_the_writer_runs(tmp_path):
+    log = HistoryLog(str(tmp_path), flush_interval=3600)
+    log.append("s1", "1", ("1",), CHOOSING, timestamp=1.0)
+    assert read_history(str(tmp_path), "s1") == []
+    log.close()
+    assert len(read_history(str(tmp_path), "s1")) == 1
+
+
+class FailingFile:
+    """A segment file whose flushes fail while failures[0] > 0, each after writing part of the data (a torn frame)."""
+
+    def __init__(self, file, failures):
+        self.file = file
+        self.name = file.name
+        self.failures = failures
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def flush(self):
+        if self.failures[0]:
+            self.failures[0] -= 1
+            self.file.flush()
+            self.file.raw.truncate(self.file.tell() - 3)
+            raise OSError(28, "No space left on device")
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def test_a_failed_write_is_reported_and_retried(tmp_path, capsys, monkeypatch):
+    log = HistoryLog(str(tmp_path), flush_interval=0.01)
+    log.append("s1", "1", ("1",), CHOOSING, timestamp=1.0)
+    deadline = time.monotonic() + 5
+    while log._flushed == 0:
+        assert time.monotonic() < deadline, "the writer thread never flushed"
+        time.sleep(0.01)
+    failures = [3]
+    log._file = FailingFile(log._file, failures)
+    monkeypatch.setattr(history, "open", lambda *args, **kwargs: FailingFile(open(*args, **kwargs), failures),
+                        raising=False)  # the segment reopened after each failure
+    for i in range(2, 6):
+        log.append("s1", str(i), ("1",), CHOOSING, timestamp=float(i))
+    while failures[0] or log.error is not None or log._pending:
+        assert time.monotonic() < deadline, "the writer thread never recovered"
+        time.sleep(0.01)
+    log.close()
+    monkeypatch.undo()
+
+    assert [turn[1] for turn in read_history(str(tmp_path), "s1")] == ["1", "2", "3", "4", "5"]
+    err = capsys.readouterr().err
+    assert err.count("Chat history write failed, retrying: [Errno 28] No space left on device") == 1
+    assert "Chat history writes resumed (0 turns dropped)" in err
+
+
+def test_a_full_queue_drops_new_turns(tmp_path, capsys):
+    log = HistoryLog(str(tmp_path), flush_interval=3600, max_pending=5)
+    for i in range(8):
+        log.append("s1", str(i), ("1",), CHOOSING, timestamp=float(i))
+    assert log.dropped == 3
+    log.close()
+    assert [turn[1] for turn in read_history(str(tmp_path), "s1")] == ["0", "1", "2", "3", "4"]
+    assert "Chat history queue is full (5 records), dropping turns" in capsys.readouterr().err
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import snapshot
+from hotreload import TreeVersions
+from Main import load_engine
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+SCRIPTS = ["menu.json", "kalam.json", "po.json", "spiderman.json"]
+
+
+@pytest.fixture
+def menu_path(tmp_path):
+    for name in SCRIPTS:
+        shutil.copy(os.path.join(SCRIPTS_DIR, name), tmp_path / name)
+    return str(tmp_path / "menu.json")
+
+
+def menus(node):
+    stack, found = [node], []
+    while stack:
+        node = stack.pop()
+        found.append(node)
+        for option in node["options"].values():
+            if "followup" in option:
+                stack.append(option["followup"])
+            elif "options" in option:
+                stack.append(option)
+    return found
+
+
+def edit_po(tmp_path):
+    po_path = tmp_path / "po.json"
+    po = json.loads(po_path.read_text(encoding="utf-8"))
+    po["followup"]["prompt"] = "What now, my friend?"
+    po_path.write_text(json.dumps(po), encoding="utf-8")
+
+
+def test_reload_compiles_only_what_changed(menu_path, tmp_path):
+    versions = TreeVersions(menu_path)
+    old = versions.current
+    assert versions.built == len({id(node) for node in menus(old)})
+    assert all("_index" in node and all("_reply" in o for o in node["options"].values()) for node in menus(old))
+
+    edit_po(tmp_path)
+    assert versions.reload(force=True)
+
+    new = versions.current
+    assert new["options"]["1"] is old["options"]["1"]  # Kalam and Spider-Man are untouched
+    assert new["options"]["3"] is old["options"]["3"]
+    assert new["options"]["2"]["followup"]["prompt"] == "What now, my friend?"
+    assert versions.built == 2  # the main menu and Po's first menu; Po's submenus are shared
+    for node in menus(new):
+        assert "_index" in node
+        assert all("_reply" in option for option in node["options"].values())
+
+
+def test_reload_without_changes_keeps_the_version(menu_path):
+    versions = TreeVersions(menu_path)
+    assert not versions.reload(force=True)
+    assert versions.built == 0
+    assert versions.version == 0
+
+
+def test_versions_start_from_a_lazily_loaded_tree(menu_path, tmp_path):
+    load_engine(menu_path)  # compiles and writes the snapshot
+    old = load_engine(menu_path)
+    versions = TreeVersions(menu_path, root=old)
+    assert versions.current is old
+    assert not any(option["followup"].materialized for option in old["options"].values())
+
+    edit_po(tmp_path)
+    assert versions.reload(force=True)
+    new = versions.current
+    assert new["options"]["1"] is old["options"]["1"]
+    assert new["options"]["3"] is old["options"]["3"]
+    assert isinstance(new["options"]["1"]["followup"], snapshot.LazySection)
+    assert new["options"]["2"]["followup"]["prompt"] == "What now, my friend?"
+    assert versions.built == 2
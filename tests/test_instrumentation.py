@@ -0,0 +1,136 @@
+import json
+import time
+
+import pytest
+
+import Main
+from cache import MatchCache
+from instrumentation import BUCKETS, Histogram, MatchStats, json_dumper, prometheus_exporter, to_prometheus
+from Main import ConversationSession, OptionIndex, chatbot, match_option
+
+OPTIONS = {"1": {"text": "Hello there"}, "2": {"text": "Goodbye"}, "3": {"text": "Tell me about training"}}
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    monkeypatch.setattr(Main, "MATCH_CACHE", MatchCache(maxsize=100))
+    stats = Main.enable_instrumentation()
+    yield stats
+    Main.disable_instrumentation()
+
+
+def test_stage_hits_and_no_matches_are_recorded(stats):
+    index = OptionIndex(OPTIONS)
+    inputs = [("2", "2"), ("goodbye", "2"), ("helo ther", "1"), ("food for training", "3"),
+              ("zzz", None), ("Goodbye!", "2"), ("zzz", None)]
+    for user_input, expected in inputs:
+        assert match_option(user_input, OPTIONS, index) == expected
+    snapshot = stats.snapshot()
+    # The second "Goodbye" and "zzz" come from the cache, a cached "no match" included
+    assert snapshot["stage_hits"] == {"key": 1, "cache": 2, "substring": 1, "fuzzy": 1, "keywords": 1}
+    runs = {stage: data["count"] for stage, data in snapshot["stage_seconds"].items()}
+    assert runs == {"key": 7, "cache": 6, "substring": 4, "fuzzy": 3, "keywords": 2}
+    assert snapshot["no_match"] == 2
+    assert snapshot["match_seconds"]["count"] == 7
+
+
+def test_node_visits_are_recorded(stats):
+    session = ConversationSession(chatbot, color=False)
+    for user_input in ["1", "restart", "1", "xx"]:
+        session.send(user_input)
+    assert stats.snapshot()["node_visits"] == {"1": 2, "/": 1}
+
+
+def test_instrumentation_is_off_by_default():
+    assert Main.INSTRUMENT is None
+    assert match_option("goodbye", OPTIONS, OptionIndex(OPTIONS)) == "2"
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram()
+    for seconds in (0.5e-6, 3e-6, 3e-6, 0.2, 1e-3):
+        hist.observe(seconds)
+    buckets = dict(hist.snapshot()["buckets"])
+    assert (buckets[1e-6], buckets[2e-6], buckets[5e-6], buckets[5e-4], buckets[1e-3]) == (1, 1, 3, 3, 4)
+    assert (buckets[0.1], buckets["+Inf"]) == (4, 5)
+    assert len(buckets) == len(BUCKETS)
+    assert hist.snapshot()["count"] == 5
+    assert hist.snapshot()["sum"] == pytest.approx(0.2010065)
+
+
+def test_prometheus_text_format():
+    stats = MatchStats()
+    stats.record_stage("key", 3e-6, False)
+    stats.record_stage("substring", 4e-6, True)
+    stats.record_match("substring", 8e-6)
+    stats.record_match(None, 2e-5)
+    stats.record_visit(("1",))
+    stats.record_visit(())
+    lines = to_prometheus(stats.snapshot()).splitlines()
+
+    assert lines[:2] == ["# HELP chatbot_match_stage_seconds Time spent in each match_option stage.",
+                         "# TYPE chatbot_match_stage_seconds histogram"]
+    assert 'chatbot_match_stage_seconds_bucket{stage="key",le="2e-06"} 0' in lines
+    assert 'chatbot_match_stage_seconds_bucket{stage="key",le="5e-06"} 1' in lines
+    assert 'chatbot_match_stage_seconds_bucket{stage="substring",le="+Inf"} 1' in lines
+    assert 'chatbot_match_stage_seconds_count{stage="substring"} 1' in lines
+    assert "# TYPE chatbot_match_stage_hits_total counter" in lines
+    assert 'chatbot_match_stage_hits_total{stage="key"} 0' in lines
+    assert 'chatbot_match_stage_hits_total{stage="substring"} 1' in lines
+    assert 'chatbot_match_seconds_bucket{le="1e-05"} 1' in lines
+    assert 'chatbot_match_seconds_bucket{le="+Inf"} 2' in lines
+    assert "chatbot_match_seconds_count 2" in lines
+    assert "chatbot_no_match_total 1" in lines
+    assert lines[-2:] == ['chatbot_node_visits_total{node="/"} 1', 'chatbot_node_visits_total{node="1"} 1']
+
+    # Every sample line is "name{labels} value" with a numeric value, under a TYPE line for its family
+    families = set()
+    for line in lines:
+        if line.startswith("# TYPE "):
+            families.add(line.split()[2])
+        elif not line.startswith("# "):
+            sample, value = line.rsplit(" ", 1)
+            float(value)
+            name = sample.split("{", 1)[0]
+            assert any(name == family or name in (family + "_bucket", family + "_sum", family + "_count")
+                       for family in families), line
+
+
+def test_node_labels_are_escaped():
+    stats = MatchStats()
+    stats.record_visit(('say "hi"', "back\\slash"))
+    assert 'chatbot_node_visits_total{node="say \\"hi\\"/back\\\\slash"} 1' in to_prometheus(stats.snapshot())
+
+
+def test_exporters_write_a_final_snapshot_on_stop(tmp_path):
+    stats = MatchStats()
+    stats.record_match(None, 1e-3)
+    json_path, prom_path = str(tmp_path / "stats.json"), str(tmp_path / "stats.prom")
+    for exporter in (json_dumper(stats, json_path, interval=3600).start(),
+                     prometheus_exporter(stats, prom_path, interval=3600).start()):
+        exporter.stop()
+    with open(json_path, encoding="utf-8") as f:
+        assert json.load(f)["no_match"] == 1
+    with open(prom_path, encoding="utf-8") as f:
+        assert "chatbot_no_match_total 1\n" in f.read()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["stats.json", "stats.prom"]
+
+
+def test_periodic_exporter_rewrites_the_file(tmp_path):
+    stats = MatchStats()
+    path = str(tmp_path / "stats.prom")
+    exporter = prometheus_exporter(stats, path, interval=0.01).start()
+    try:
+        stats.record_match(None, 1e-3)
+        for _ in range(500):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    if "chatbot_no_match_total 1\n" in f.read():
+                        break
+            except FileNotFoundError:
+                pass
+            time.sleep(0.01)
+        else:
+            pytest.fail("the exporter never wrote the new snapshot")
+    finally:
+        exporter.stop()
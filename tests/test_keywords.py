@@ -0,0 +1,75 @@
+import math
+import random
+
+import pytest
+
+from keywords import KeywordMatrix, Vocabulary
+from Main import OptionIndex, extract_keywords, match_keywords, normalize
+
+WORDS = [f"word{i}" for i in range(40)]
+
+
+def sorted_overlap(texts, utterance):
+    """The keyword stage KeywordMatrix replaces: overlap counts, stable-sorted, the first one wins."""
+    user_words = set(normalize(utterance).split())
+    matches = [(pos, len(user_words & extract_keywords(text))) for pos, text in enumerate(texts)]
+    matches = [match for match in matches if match[1]]
+    matches.sort(key=lambda match: -match[1])
+    return matches[0][0] if matches else None
+
+
+def matrix(texts, weighting="count"):
+    return KeywordMatrix([extract_keywords(text) for text in texts], weighting, Vocabulary())
+
+
+def test_ties_go_to_the_first_option_with_the_highest_overlap():
+    texts = ["tell me about training", "training and food", "food and training and fights", "fights"]
+    m = matrix(texts)
+    assert m.best({"training"}) == 0
+    assert m.best({"food", "training"}) == 1  # 1 and 2 both share two words
+    assert m.best({"food", "training", "fights"}) == 2
+    assert m.best({"nothing"}) is None
+
+
+def test_count_weighting_matches_the_sorted_overlap():
+    rng = random.Random(7)
+    for _ in range(300):
+        texts = [" ".join(rng.sample(WORDS, rng.randint(1, 6))) for _ in range(rng.randint(1, 15))]
+        m = matrix(texts)
+        for _ in range(10):
+            utterance = " ".join(rng.sample(WORDS, rng.randint(1, 6)))
+            assert m.best(set(utterance.split())) == sorted_overlap(texts, utterance), (texts, utterance)
+
+
+def test_tfidf_weighs_rare_keywords_higher():
+    texts = ["kung fu dumplings", "noodles shop", "kung fu training", "kung fu"]
+    m = matrix(texts, "tfidf")
+    assert m.weights[m.vocabulary.get("kung")] == pytest.approx(math.log(5 / 4) + 1)
+    assert m.weights[m.vocabulary.get("noodles")] == pytest.approx(math.log(5 / 2) + 1)
+    assert matrix(texts).best({"kung", "noodles"}) == 0  # one word each: a tie, so the first option
+    assert m.best({"kung", "noodles"}) == 1  # the rarer word counts for more
+    assert m.best({"kung", "training"}) == 2
+
+
+def test_unknown_weighting_is_rejected():
+    with pytest.raises(ValueError):
+        KeywordMatrix([{"a"}], "bm25")
+
+
+@pytest.mark.parametrize("weighting", ["count", "tfidf"])
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_best_many_agrees_with_best(weighting, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    rng = random.Random(weighting)
+    for _ in range(100):
+        m = KeywordMatrix([set(rng.sample(WORDS, rng.randint(0, 6))) for _ in range(rng.randint(0, 30))],
+                          weighting, Vocabulary())
+        queries = [set(rng.sample(WORDS, rng.randint(0, 8))) for _ in range(rng.randint(0, 20))]
+        assert m.best_many(queries, use_numpy) == [m.best(words) for words in queries]
+
+
+def test_stage_four_uses_the_node_matrix():
+    options = {"1": {"text": "Tell me about training"}, "2": {"text": "Training and food"}}
+    assert match_keywords("food for training", OptionIndex(options)) == "2"
+    assert match_keywords("all about training", OptionIndex(options, keyword_weighting="tfidf")) == "1"
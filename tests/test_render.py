@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+from render import Renderer, TextRenderer
+
+
+class RecordingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+def test_renderer_needs_a_write():
+    with pytest.raises(TypeError):
+        Renderer()
+
+
+def test_lines_are_written_in_batches():
+    stream = RecordingStream()
+    renderer = TextRenderer(stream, batch_lines=3)
+    renderer.emit(["a", "b"])
+    assert stream.writes == 0
+    renderer.emit(["c", "d"])
+    assert (stream.getvalue(), stream.writes) == ("a\nb\nc\nd\n", 1)
+    renderer.emit(["e"])
+    renderer.flush()
+    renderer.flush()
+    assert (stream.getvalue(), stream.writes) == ("a\nb\nc\nd\ne\n", 2)
+
+
+def test_batch_of_one_streams_every_line():
+    stream = RecordingStream()
+    renderer = TextRenderer(stream, batch_lines=1)
+    renderer.emit(["a"])
+    renderer.emit(["b"])
+    assert (stream.getvalue(), stream.writes) == ("a\nb\n", 2)
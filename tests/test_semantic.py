@@ -0,0 +1,76 @@
+import pytest
+
+import Main
+import semantic
+from Main import chatbot, match_option, resolve_path, semantic_text
+from semantic import SemanticMatcher
+
+# (path, utterance, expected key): paraphrases none of the first four stages match
+PARAPHRASES = [
+    (("1",), "how did you deal with failing?", "2"),
+    (("1",), "how do you stay motivated", "2"),
+    (("1",), "tell me about the space rockets you launched", "1"),
+    (("2", "2"), "train me", "3"),
+    (("3", "2"), "cheer me up", "3"),
+]
+UNRELATED = ["asdfgh qwerty", "play some jazz", "i need to reset my password", "recommend a good movie",
+             "my printer is broken", "call my mother", "buy more milk", "lorem ipsum dolor"]
+MENUS = [(), ("1",), ("2",), ("3",), ("2", "2"), ("3", "2")]
+
+
+@pytest.fixture
+def semantic_stage():
+    Main.enable_semantic_stage()
+    yield
+    Main.disable_semantic_stage()
+
+
+def match(path, utterance):
+    node = resolve_path(chatbot, path)
+    return match_option(utterance, node["options"], node["_index"])
+
+
+def test_paraphrases_need_the_semantic_stage():
+    assert [match(path, utterance) for path, utterance, _ in PARAPHRASES] == [None] * len(PARAPHRASES)
+
+
+def test_default_threshold_matches_paraphrases(semantic_stage):
+    assert [match(path, utterance) for path, utterance, _ in PARAPHRASES] == [key for _, _, key in PARAPHRASES]
+
+
+def test_default_threshold_ignores_unrelated_requests(semantic_stage):
+    assert [(path, text) for path in MENUS for text in UNRELATED if match(path, text) is not None] == []
+
+
+def test_navigation_options_are_not_embedded():
+    options = resolve_path(chatbot, ("2", "2"))["options"]
+    assert semantic_text(options["4"]) == ""
+    assert "Tai Lung" in semantic_text(options["2"])  # from the menu "Do you ever get scared" leads to
+
+
+def test_stopwords_only_match_nothing():
+    matcher = SemanticMatcher(["how are you", "what is it"], use_numpy=False)
+    assert matcher.best("how are you") is None
+
+
+def test_earliest_option_wins_ties():
+    matcher = SemanticMatcher(["dumplings", "noodles", "dumplings"], use_numpy=False)
+    assert matcher.best("dumplings") == 0
+    assert matcher.best_many(["noodles", "jazz"]) == [1, None]
+
+
+def texts_of(path):
+    return [Main.normalize(semantic_text(option)) for option in resolve_path(chatbot, path)["options"].values()]
+
+
+def test_numpy_and_big_int_backends_agree():
+    pytest.importorskip("numpy")
+    utterances = [Main.normalize(u) for _, u, _ in PARAPHRASES] + UNRELATED + ["dumplings", "kung fu", "swinging"]
+    for path in MENUS:
+        columns = SemanticMatcher(texts_of(path), use_numpy=False)
+        matrix = SemanticMatcher(texts_of(path), use_numpy=True)
+        assert matrix.matrix is not None
+        for threshold in (0.0001, semantic.DEFAULT_THRESHOLD):
+            expected = [columns.best(u, threshold) for u in utterances]
+            assert [matrix.best(u, threshold) for u in utterances] == expected
+            assert matrix.best_many(utterances, threshold) == expected
@@ -0,0 +1,141 @@
+import asyncio
+
+import history
+from cluster import HashRing, Router, owned_session_id, owned_sessions
+from Main import CHOOSING, LEAF, ConversationSession, chatbot
+from server import PROMPT_PREFIX, ROUTE_PREFIX, SESSION_PREFIX, ChatServer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_server(tmp_path, **kwargs):
+    return ChatServer(log=history.HistoryLog(str(tmp_path)), **kwargs)
+
+
+def test_detached_sessions_are_bounded(tmp_path):
+    server = make_server(tmp_path, max_detached=3)
+    for i in range(51):
+        server.detach(ConversationSession(chatbot, session_id=f"s{i}"))
+    assert list(server.detached) == ["s48", "s49", "s50"]
+    assert server.resume("s0") is None
+    assert server.resume("s50").session_id == "s50"
+    assert "s50" not in server.detached
+    server.log.close()
+
+
+def test_detached_sessions_expire(tmp_path):
+    clock = Clock()
+    server = make_server(tmp_path, detached_ttl=60, clock=clock)
+    server.detach(ConversationSession(chatbot, session_id="old"))
+    clock.now = 30
+    server.detach(ConversationSession(chatbot, session_id="new"))
+    clock.now = 61
+    assert server.resume("old") is None
+    assert server.resume("new") is not None
+    server.detach(ConversationSession(chatbot, session_id="newer"))
+    clock.now = 200
+    server.detach(ConversationSession(chatbot, session_id="newest"))
+    assert list(server.detached) == ["newest"]
+    server.log.close()
+
+
+async def read_until_prompt(reader):
+    lines = []
+    while True:
+        line = (await reader.readline()).decode("utf-8")
+        assert line, f"connection closed after {lines!r}"
+        lines.append(line.rstrip("\n"))
+        if line.startswith(PROMPT_PREFIX):
+            return lines
+
+
+async def route_session(tmp_path, resume_wait):
+    worker = make_server(tmp_path, routed=True, color=False)
+    worker_listener = await worker.start(port=0)
+    router = Router(HashRing([0]), {0: worker_listener.sockets[0].getsockname()}, resume_wait=resume_wait)
+    router_listener = await asyncio.start_server(router.handle, "127.0.0.1", 0)
+    port = router_listener.sockets[0].getsockname()[1]
+    try:
+        # A new conversation: the greeting comes without the client sending anything
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        greeting = await read_until_prompt(reader)
+        session_id = greeting[0][len(SESSION_PREFIX):]
+        writer.write(b"1\n")
+        await read_until_prompt(reader)
+        writer.close()
+        while worker.active:
+            await asyncio.sleep(0.01)
+
+        # Resume: SESSION sent straight away never opens a throwaway session
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"{SESSION_PREFIX}{session_id}\n".encode("utf-8"))
+        resumed = await read_until_prompt(reader)
+        writer.close()
+        while worker.active:
+            await asyncio.sleep(0.01)
+        return session_id, resumed, worker.served
+    finally:
+        router_listener.close()
+        worker_listener.close()
+        worker.log.close()
+
+
+def test_router_resumes_without_a_throwaway_session(tmp_path):
+    session_id, resumed, served = asyncio.run(route_session(tmp_path, resume_wait=0.2))
+    assert resumed[0] == f"{SESSION_PREFIX}{session_id}"
+    assert f"Resumed session {session_id}." in resumed
+    assert served == 2
+
+
+def test_sessions_follow_the_ring_across_worker_logs(tmp_path):
+    old_logs = [history.HistoryLog(str(tmp_path / f"worker-{i}")) for i in range(3)]
+    ids = [f"session-{i}" for i in range(30)]
+    for i, session_id in enumerate(ids):
+        old_logs[i % 3].append(session_id, "1", ("1",), CHOOSING, timestamp=1.0)
+    old_logs[0].append(ids[1], "3", ("1", "3"), LEAF, timestamp=2.0)  # moved from worker 1 to 0
+    for log in old_logs:
+        log.close()
+
+    ring = HashRing(range(2))
+    owned = [owned_sessions(str(tmp_path), ring, worker) for worker in range(2)]
+    assert sorted(owned[0]) + sorted(owned[1]) == sorted(ids, key=lambda sid: (ring.lookup(sid), sid))
+    moved = owned[ring.lookup(ids[1])][ids[1]]
+    assert (moved.path, moved.state, moved.turns) == (("1", "3"), LEAF, 2)
+
+
+async def resume_unknown(tmp_path, client_id):
+    worker = make_server(tmp_path, routed=True, color=False)
+    listener = await worker.start(port=0)
+    try:
+        reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname())
+        writer.write(ROUTE_PREFIX.encode("utf-8") + client_id + b" resume\n")
+        greeting = await read_until_prompt(reader)
+        writer.write(b"1\n")
+        await read_until_prompt(reader)
+        writer.close()
+        while worker.active:
+            await asyncio.sleep(0.01)
+        return greeting
+    finally:
+        listener.close()
+        worker.log.close()
+
+
+def test_routed_resume_of_an_unknown_id_starts_a_fresh_session(tmp_path):
+    client_id = b"\xff" * 30000  # each byte decodes to a 3-byte U+FFFD
+    greeting = asyncio.run(resume_unknown(tmp_path, client_id))
+    session_id = greeting[0][len(SESSION_PREFIX):]
+    assert len(session_id) == 32 and session_id != client_id.decode("utf-8", errors="replace")
+    assert "No saved session with that id, starting fresh." in greeting
+    assert [turn[1] for turn in history.read_history(str(tmp_path), session_id)] == ["1"]
+
+
+def test_fresh_session_ids_belong_to_their_worker():
+    ring = HashRing(range(4))
+    assert all(ring.lookup(owned_session_id(ring, worker)) == worker for worker in range(4) for _ in range(20))
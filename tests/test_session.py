@@ -0,0 +1,107 @@
+import io
+import random
+
+from Main import (CHOOSING, DEFAULT_EMOJI, LEAF, ConversationSession, chatbot, match_option,
+                  normalize, render_reply, run_conversation)
+from render import TextRenderer
+
+CHOOSE_PROMPT = "Your choice (or type 'switch', 'restart', or 'exit'): "
+LEAF_PROMPT = "Type 'menu' to switch characters, or 'exit' to quit: "
+INPUTS = ["1", "2", "3", "4", "menu", "restart", "switch", "xx", "dragon warior", "motivashun",
+          "return to main menu", "training"]
+
+
+def recursive_conversation(node, main_menu, read, write):
+    """
+    The recursive loop ConversationSession replaced, kept as the reference for navigation.
+    Replies are rendered the current way, so only the speaker fixes are left out of the comparison.
+    """
+    while True:
+        write("\n" + node["prompt"])
+        for key, option in node["options"].items():
+            write(f"{option.get('emoji', DEFAULT_EMOJI)} {key}. {option['text']}")
+        choice_raw = read(CHOOSE_PROMPT).strip()
+        choice_norm = normalize(choice_raw)
+        if choice_norm == "exit":
+            write("👋 Thank you for chatting! Skadoosh and stay awesome!")
+            return True
+        if choice_norm == "restart":
+            write("🔁 Restarting conversation...")
+            return recursive_conversation(main_menu, main_menu, read, write)
+        if choice_norm == "switch":
+            write("🔄 Switching characters...")
+            return recursive_conversation(main_menu, main_menu, read, write)
+        matched_key = match_option(choice_raw, node["options"])
+        if not matched_key:
+            write("\nInvalid choice. Please try again.")
+            continue
+        selected = node["options"][matched_key]
+        write(render_reply(selected)[0])
+        if "followup" in selected:
+            if recursive_conversation(selected["followup"], main_menu, read, write):
+                return True
+        elif selected.get("text", "").lower() == "return to main menu":
+            if recursive_conversation(main_menu, main_menu, read, write):
+                return True
+        elif "options" in selected:
+            if recursive_conversation(selected, main_menu, read, write):
+                return True
+        else:
+            write("\n💬 That’s all I have to share on that topic.")
+            next_action = read(LEAF_PROMPT).strip().lower()
+            if next_action == "menu":
+                return recursive_conversation(main_menu, main_menu, read, write)
+            elif next_action == "exit":
+                write("👋 Goodbye!")
+                return True
+
+
+def scripted_reader(script, write):
+    """An input() that takes its answers from script and writes each prompt to the transcript."""
+    inputs = iter(script)
+
+    def read(prompt):
+        write(prompt + "\n")
+        return next(inputs)
+
+    return read
+
+
+def tree_depth(node):
+    depth = 0
+    for option in node["options"].values():
+        menu = option["followup"] if "followup" in option else option if "options" in option else None
+        if menu is not None and option.get("goto") != "main_menu":
+            depth = max(depth, 1 + tree_depth(menu))
+    return depth
+
+
+def test_scripted_transcripts_match_the_recursive_navigation():
+    rng = random.Random(11)
+    for _ in range(20):
+        script = [rng.choice(INPUTS) for _ in range(150)] + ["exit", "exit"]
+        expected = io.StringIO()
+        recursive_conversation(chatbot, chatbot, scripted_reader(script, expected.write),
+                               lambda line: expected.write(line + "\n"))
+        stream = io.StringIO()
+        run_conversation(chatbot, chatbot, TextRenderer(stream), scripted_reader(script, stream.write))
+        assert stream.getvalue() == expected.getvalue()
+
+
+def test_a_long_session_keeps_the_stack_bounded():
+    rng = random.Random(3)
+    depth = tree_depth(chatbot)
+    session = ConversationSession(chatbot, color=False)
+    deepest = 0
+    for turn in range(30000):
+        if turn % 1000 == 999:
+            # Now and then, dive to the bottom of the tree from wherever the session is
+            for user_input in ["restart", "restart", "3", "2", "1", "1", "3", "1"]:
+                session.send(user_input)
+        else:
+            session.send(rng.choice(INPUTS))
+        assert not session.finished
+        assert len(session.stack.frames) <= depth, (turn, session.stack.path)
+        deepest = max(deepest, len(session.stack.frames))
+        assert session.state in (CHOOSING, LEAF)
+    assert deepest == depth
@@ -0,0 +1,130 @@
+import os
+import pickle
+import shutil
+import threading
+
+import pytest
+
+import snapshot
+from dialogue import load_json_tree, script_sources
+from Main import SCRIPTS_MENU, ConversationSession, OptionIndex, compile_tree
+
+SETTINGS = ("test", "count", False)
+
+
+@pytest.fixture
+def menu_path(tmp_path):
+    for path in script_sources(SCRIPTS_MENU):
+        shutil.copy(path, tmp_path / os.path.basename(path))
+    return str(tmp_path / "menu.json")
+
+
+def save(menu_path, path):
+    tree = compile_tree(load_json_tree(menu_path))
+    return snapshot.save(path, tree, script_sources(menu_path), OptionIndex, SETTINGS)
+
+
+def test_round_trip(menu_path, tmp_path):
+    path = save(menu_path, str(tmp_path / "menu.snapshot"))
+    tree = snapshot.load(path, OptionIndex, SETTINGS)
+    assert tree["options"]["1"]["followup"]["_index"].keys == ["1", "2", "3"]
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_stale_when_a_script_changes(menu_path, tmp_path):
+    path = save(menu_path, str(tmp_path / "menu.snapshot"))
+    with open(tmp_path / "po.json", "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert snapshot.load(path, OptionIndex, SETTINGS) is None
+
+
+def test_stale_when_the_settings_change(menu_path, tmp_path):
+    path = save(menu_path, str(tmp_path / "menu.snapshot"))
+    assert snapshot.load(path, OptionIndex, ("test", "tfidf", False)) is None
+
+
+@pytest.fixture
+def code_dir(tmp_path, monkeypatch):
+    code = tmp_path / "code"
+    code.mkdir()
+    for name in snapshot.CODE_MODULES:
+        shutil.copy(os.path.join(snapshot.CODE_DIR, name), code / name)
+    monkeypatch.setattr(snapshot, "CODE_DIR", str(code))
+    return code
+
+
+@pytest.mark.parametrize("module", ["semantic.py", "dialogue.py"])
+def test_stale_when_the_code_changes(menu_path, tmp_path, code_dir, module):
+    path = save(menu_path, str(tmp_path / "menu.snapshot"))
+    assert snapshot.load(path, OptionIndex, SETTINGS) is not None
+    with open(code_dir / module, "a", encoding="utf-8") as f:
+        f.write("# changed\n")
+    assert snapshot.load(path, OptionIndex, SETTINGS) is None
+
+
+def test_failed_save_leaves_no_temporary_file(menu_path, tmp_path):
+    with pytest.raises(TypeError):
+        snapshot.save(str(tmp_path / "menu.snapshot"), {"lock": threading.Lock()}, script_sources(menu_path),
+                      OptionIndex, SETTINGS)
+    assert [name for name in os.listdir(tmp_path) if "snapshot" in name] == []
+
+
+def test_conversations_are_loaded_on_first_visit(menu_path, tmp_path):
+    path = save(menu_path, str(tmp_path / "menu.snapshot"))
+    tree = snapshot.load(path, OptionIndex, SETTINGS)
+    sections = {key: option["followup"] for key, option in tree["options"].items()}
+    assert all(isinstance(section, snapshot.LazySection) and not section.materialized
+               for section in sections.values())
+
+    session = ConversationSession(tree, color=False)
+    session.send("po")
+    assert session.node is sections["2"]
+    assert session.menu()[1].endswith("What’s it like being the Dragon Warrior?")
+    assert [key for key, section in sections.items() if section.materialized] == ["2"]
+    session.send("dragon warior")  # a typo, matched by the section's own index
+    assert session.stack.path == ("2", "1")
+
+    below = [option["followup"] for option in sections["2"]["options"].values() if "followup" in option]
+    assert [isinstance(node, snapshot.LazySection) and node.materialized for node in below] == [False, False]
+    session.menu()
+    assert [node.materialized for node in below] == [True, False]
+
+
+def test_load_sections_loads_every_conversation(menu_path, tmp_path):
+    path = save(menu_path, str(tmp_path / "menu.snapshot"))
+    tree = snapshot.load_sections(snapshot.load(path, OptionIndex, SETTINGS))
+    stack, loaded = [tree], 0
+    while stack:
+        for option in stack.pop()["options"].values():
+            if "followup" in option:
+                assert option["followup"].materialized
+                stack.append(option["followup"])
+                loaded += 1
+    assert loaded == len(snapshot.Snapshot((tmp_path / "menu.snapshot").read_bytes(), OptionIndex).offsets) - 2
+
+
+class Planted:
+    """Makes a directory when unpickled, standing in for a snapshot crafted to run code."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return os.mkdir, (self.path,)
+
+
+def test_a_header_never_runs_code(menu_path, tmp_path):
+    path = tmp_path / "menu.snapshot"
+    path.write_bytes(snapshot.MAGIC + pickle.dumps(Planted(str(tmp_path / "planted"))))
+    assert snapshot.load(str(path), OptionIndex, SETTINGS) is None
+    assert not (tmp_path / "planted").exists()
+
+
+def test_a_current_snapshot_only_unpickles_allowed_classes(menu_path, tmp_path):
+    menu = pickle.dumps({"prompt": "?", "options": {}, "_planted": Planted(str(tmp_path / "planted"))})
+    header = snapshot.MAGIC + pickle.dumps(snapshot.make_header(script_sources(menu_path), SETTINGS))
+    table = pickle.dumps({"offsets": [len(header)], "vocabulary": {}})
+    path = tmp_path / "menu.snapshot"
+    path.write_bytes(header + menu + table + snapshot.TRAILER.pack(len(header) + len(menu)))
+    assert snapshot.load(str(path), OptionIndex, SETTINGS) is None
+    assert not (tmp_path / "planted").exists()
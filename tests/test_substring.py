@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+import keywords
+from Main import OptionIndex, match_option, match_substring
+from substring import SEPARATOR, AhoCorasick, SubstringMatcher, SuffixIndex
+
+
+def linear_scan(texts, text):
+    """The scan SubstringMatcher replaces: the earliest text equal to, containing or contained in text."""
+    for pos, option in enumerate(texts):
+        if text == option or text in option or option in text:
+            return pos
+    return None
+
+
+def random_texts(rng, alphabet, count, max_len):
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("alphabet", ["ab", "ab c", "abcdefgh "])
+def test_matcher_agrees_with_linear_scan(alphabet):
+    rng = random.Random(alphabet)
+    for _ in range(300):
+        texts = random_texts(rng, alphabet, rng.randint(0, 12), 8)
+        matcher = SubstringMatcher(texts)
+        for query in random_texts(rng, alphabet, 20, 10) + texts:
+            assert matcher.first(query) == linear_scan(texts, query), (texts, query)
+
+
+def test_automaton_finds_smallest_contained_pattern():
+    rng = random.Random(1)
+    for _ in range(300):
+        patterns = random_texts(rng, "abc", rng.randint(1, 10), 5)
+        automaton = AhoCorasick(patterns)
+        for text in random_texts(rng, "abc", 20, 12):
+            expected = min((i for i, p in enumerate(patterns) if p in text), default=None)
+            assert automaton.first(text) == expected
+
+
+def sorted_by_slices(texts):
+    joined = SEPARATOR.join(texts) + SEPARATOR
+    ends = []
+    for text in texts:
+        ends.extend([len(ends) + len(text)] * (len(text) + 1))
+    starts = [i for i in range(len(joined)) if joined[i] != SEPARATOR]
+    return sorted(starts, key=lambda i: joined[i:ends[i]])
+
+
+@pytest.mark.parametrize("alphabet,max_len", [("ab", 40), ("ab 💡", 70), ([chr(0x4E00 + i) for i in range(300)], 30)])
+def test_suffix_order_matches_sorting_whole_suffixes(alphabet, max_len):
+    rng = random.Random(max_len)
+    for _ in range(200):
+        texts = random_texts(rng, alphabet, rng.randint(0, 10), max_len)
+        texts += texts[:2]  # duplicate texts: equal suffixes across texts
+        assert list(SuffixIndex(texts).suffixes) == sorted_by_slices(texts)
+
+
+def test_long_repetitive_texts():
+    texts = ["abc " * 300, "abc " * 299 + "abd", "bc a" * 300]
+    index = SuffixIndex(texts)
+    assert list(index.suffixes) == sorted_by_slices(texts)
+    assert index.first("abd") == 1
+    assert index.first("bc abc") == 0
+    assert index.first("cab") is None
+
+
+def test_index_builds_the_automata_on_the_first_lookup():
+    options = {str(i): {"text": f"option {i} about topic {i % 7}"} for i in range(OptionIndex.SUBSTRING_SCAN_MAX + 1)}
+    index = OptionIndex(options)
+    assert index.substring is None
+    assert match_substring("option 12 about topic 5", index) == "12"
+    assert index.substring is not None
+
+
+def test_match_option_without_an_index_leaves_the_shared_vocabulary_alone():
+    before = len(keywords.VOCABULARY)
+    assert match_option("zyxwv qutsr", {"1": {"text": "Zyxwv qutsr ponml"}}) == "1"
+    assert len(keywords.VOCABULARY) == before